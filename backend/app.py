@@ -1,16 +1,23 @@
 """Główna aplikacja Flask"""
-from flask import Flask, jsonify, request, send_from_directory, Response
+from flask import Flask, jsonify, request, send_file, send_from_directory, url_for, Response
 from flask_cors import CORS
+from flask_migrate import Migrate
 from datetime import datetime, date, timedelta
-from typing import Optional
+from typing import List, Optional, Tuple
 import os
+from sqlalchemy.orm import load_only
 
 from .config import Config
-from .models import db, Project, User, ResourceAllocation, Absence, SyncLog
+from .models import db, Project, User, ProjectMember, ResourceAllocation, Absence, Holiday, SyncLog, SyncJob, Worklog, ExportJob
 from .jira_client import JiraClient
 from .tempo_client import TempoClient
 from .sync_service import SyncService
-from .export_service import ExportService
+from .export_service import ExportService, EXPORT_FORMATS, PDF_GROUPINGS
+from .capacity_engine import Availability, find_capacity_intervals
+from .working_calendar import WorkingCalendar
+from .load_matrix import LoadMatrix
+from .response_cache import response_cache
+from . import daily_capacity, export_jobs, sync_jobs, working_calendar
 
 # Konfiguracja ścieżki do frontendu
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,6 +47,7 @@ CORS(app)
 
 # Inicjalizacja bazy danych
 db.init_app(app)
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_pre_ping': True,
     'pool_recycle': 300,
@@ -81,6 +89,114 @@ with app.app_context():
     init_clients()
 
 
+def _lookup_table(model, ids) -> dict:
+    """Zwraca słownik id -> to_dict() dla podanych identyfikatorów (jedno zapytanie)"""
+    if not ids:
+        return {}
+    return {obj.id: obj.to_dict() for obj in model.query.filter(model.id.in_(ids)).all()}
+
+
+# ========== Listy: paginacja i wybór pól ==========
+
+# Maksymalny rozmiar strony przy paginacji (parametr limit)
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidQueryParameter(ValueError):
+    """Niepoprawny parametr zapytania (fields, limit, zakres dat, strefa czasowa)"""
+
+
+@app.errorhandler(InvalidQueryParameter)
+def handle_invalid_query_parameter(error):
+    return jsonify({'error': str(error)}), 400
+
+
+def _selected_fields(model) -> Optional[List[str]]:
+    """Zwraca kolumny z parametru fields= (None - pełna serializacja)"""
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+    
+    columns = set(model.__table__.columns.keys())
+    fields = list(dict.fromkeys(field.strip() for field in raw.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in columns]
+    if unknown:
+        raise InvalidQueryParameter(f"Nieznane pola: {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def _load_fields(query, model, fields: Optional[List[str]]):
+    """Ogranicza SELECT do wybranych kolumn"""
+    if not fields:
+        return query
+    return query.options(load_only(*[getattr(model, field) for field in fields]))
+
+
+def _serialize(obj, fields: Optional[List[str]], **kwargs) -> dict:
+    """Serializuje obiekt w całości (to_dict) albo tylko wybrane kolumny"""
+    if not fields:
+        return obj.to_dict(**kwargs)
+    data = {}
+    for field in fields:
+        value = getattr(obj, field)
+        data[field] = value.isoformat() if isinstance(value, (date, datetime)) else value
+    return data
+
+
+def _paginate(query, model, *default_order):
+    """Zwraca (obiekty, strona) - stronicowanie po id (after_id, limit).
+    
+    Bez parametru limit zwracane są wszystkie wiersze w domyślnej kolejności,
+    a strona to None. Z limitem wiersze sortowane są po id, a strona zawiera
+    next_after_id (None na ostatniej stronie).
+    """
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        return query.order_by(*default_order).all(), None
+    if limit <= 0:
+        raise InvalidQueryParameter('Parametr limit musi być liczbą dodatnią')
+    limit = min(limit, MAX_PAGE_SIZE)
+    
+    after_id = request.args.get('after_id', type=int)
+    if after_id is not None:
+        query = query.filter(model.id > after_id)
+    
+    # Jeden wiersz ponad limit mówi, czy istnieje następna strona
+    items = query.order_by(model.id).limit(limit + 1).all()
+    has_more = len(items) > limit
+    items = items[:limit]
+    return items, {'next_after_id': items[-1].id if has_more else None}
+
+
+def _list_response(items: list, page: Optional[dict]):
+    """Lista bez paginacji lub koperta {items, next_after_id}"""
+    if page is None:
+        return jsonify(items)
+    return jsonify({'items': items, **page})
+
+
+def _date_range(source=None) -> Tuple[date, date]:
+    """Zakres start_date/end_date żądania; brakujące granice liczone od dzisiaj w strefie z parametru timezone"""
+    source = request.args if source is None else source
+    tz_name = request.args.get('timezone')
+    if tz_name and not working_calendar.is_valid_timezone(tz_name):
+        raise InvalidQueryParameter(f'Nieznana strefa czasowa: {tz_name}')
+    
+    try:
+        return working_calendar.parse_date_range(source.get('start_date'), source.get('end_date'), tz_name)
+    except ValueError as e:
+        raise InvalidQueryParameter(f'Niepoprawny zakres dat: {e}')
+
+
+def _period_error(start: date, end: Optional[date]):
+    """Odpowiedź 400 dla okresu kończącego się przed początkiem (None, gdy okres jest poprawny)"""
+    if end is not None and end < start:
+        return jsonify({'error': 'end_date nie może być wcześniejsza niż start_date'}), 400
+    return None
+
+
 # ========== Health Check ==========
 
 @app.route('/api/health', methods=['GET'])
@@ -95,39 +211,72 @@ def health():
 
 # ========== Synchronizacja ==========
 
+def _enqueue_sync(job_type: str):
+    """Zleca synchronizację workerowi i od razu zwraca zadanie (202)"""
+    job = sync_jobs.enqueue(job_type)
+    data = job.to_dict()
+    data['status_url'] = url_for('get_sync_job', job_id=job.id)
+    return jsonify(data), 202
+
+
 @app.route('/api/sync/projects', methods=['POST'])
 def sync_projects():
-    """Synchronizuje projekty z Jiry"""
+    """Zleca synchronizację projektów z Jiry"""
     if not sync_service:
         return jsonify({'error': 'Jira nie jest skonfigurowane'}), 500
     
-    result = sync_service.sync_projects()
-    return jsonify(result), 200 if result.get('status') == 'success' else 500
+    return _enqueue_sync('projects')
 
 
 @app.route('/api/sync/users', methods=['POST'])
 def sync_users():
-    """Synchronizuje użytkowników z Jiry"""
+    """Zleca synchronizację użytkowników z Jiry"""
     if not sync_service:
         return jsonify({'error': 'Jira nie jest skonfigurowane'}), 500
     
-    try:
-        result = sync_service.sync_users()
-        return jsonify(result), 200 if result.get('status') == 'success' else 500
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': str(e), 'type': type(e).__name__}), 500
+    return _enqueue_sync('users')
+
+
+@app.route('/api/sync/project-members', methods=['POST'])
+def sync_project_members():
+    """Zleca synchronizację członkostwa użytkowników w projektach"""
+    if not sync_service:
+        return jsonify({'error': 'Jira nie jest skonfigurowane'}), 500
+    
+    return _enqueue_sync('project_members')
+
+
+@app.route('/api/sync/worklogs', methods=['POST'])
+def sync_worklogs():
+    """Zleca przyrostową synchronizację worklogów z Tempo"""
+    if not sync_service or not tempo_client:
+        return jsonify({'error': 'Tempo nie jest skonfigurowane'}), 500
+    
+    return _enqueue_sync('worklogs')
 
 
 @app.route('/api/sync/all', methods=['POST'])
 def sync_all():
-    """Synchronizuje wszystkie dane"""
+    """Zleca synchronizację wszystkich danych"""
     if not sync_service:
         return jsonify({'error': 'Jira nie jest skonfigurowane'}), 500
     
-    result = sync_service.sync_all()
-    return jsonify(result), 200
+    return _enqueue_sync('all')
+
+
+@app.route('/api/sync/jobs', methods=['GET'])
+def get_sync_jobs():
+    """Pobiera ostatnie zadania synchronizacji"""
+    limit = request.args.get('limit', 20, type=int)
+    jobs = SyncJob.query.order_by(SyncJob.id.desc()).limit(limit).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+
+@app.route('/api/sync/jobs/<int:job_id>', methods=['GET'])
+def get_sync_job(job_id):
+    """Zwraca status zadania synchronizacji"""
+    job = SyncJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
 
 
 @app.route('/api/sync/logs', methods=['GET'])
@@ -144,13 +293,14 @@ def get_sync_logs():
 def get_projects():
     """Pobiera listę projektów"""
     active_only = request.args.get('active_only', 'true').lower() == 'true'
-    query = Project.query
+    fields = _selected_fields(Project)
+    query = _load_fields(Project.query, Project, fields)
     
     if active_only:
         query = query.filter_by(is_active=True)
     
-    projects = query.order_by(Project.name).all()
-    return jsonify([p.to_dict() for p in projects])
+    projects, page = _paginate(query, Project, Project.name)
+    return _list_response([_serialize(p, fields) for p in projects], page)
 
 
 @app.route('/api/projects/<int:project_id>', methods=['GET'])
@@ -160,19 +310,30 @@ def get_project(project_id):
     return jsonify(project.to_dict())
 
 
+@app.route('/api/projects/<int:project_id>/members', methods=['GET'])
+def get_project_members(project_id):
+    """Pobiera użytkowników przypisanych do projektu w Jirze"""
+    Project.query.get_or_404(project_id)
+    users = User.query.join(ProjectMember).filter(
+        ProjectMember.project_id == project_id
+    ).order_by(User.display_name).all()
+    return jsonify([u.to_dict() for u in users])
+
+
 # ========== Użytkownicy ==========
 
 @app.route('/api/users', methods=['GET'])
 def get_users():
     """Pobiera listę użytkowników"""
     active_only = request.args.get('active_only', 'true').lower() == 'true'
-    query = User.query
+    fields = _selected_fields(User)
+    query = _load_fields(User.query, User, fields)
     
     if active_only:
         query = query.filter_by(is_active=True)
     
-    users = query.order_by(User.display_name).all()
-    return jsonify([u.to_dict() for u in users])
+    users, page = _paginate(query, User, User.display_name)
+    return _list_response([_serialize(u, fields) for u in users], page)
 
 
 @app.route('/api/users/<int:user_id>', methods=['GET'])
@@ -194,6 +355,10 @@ def update_user(user_id):
         user.work_hours_per_day = float(data['work_hours_per_day'])
     
     user.updated_at = datetime.utcnow()
+    if 'work_hours_per_day' in data:
+        # Zmiana godzin pracy wpływa na dostępne godziny we wszystkich dniach
+        daily_capacity.refresh_span([user.id])
+    response_cache.invalidate()
     db.session.commit()
     
     return jsonify(user.to_dict())
@@ -208,8 +373,17 @@ def get_allocations():
     end_date = request.args.get('end_date')
     user_id = request.args.get('user_id', type=int)
     project_id = request.args.get('project_id', type=int)
+    compact = request.args.get('compact', 'false').lower() == 'true'
+    fields = _selected_fields(ResourceAllocation)
+    if compact and fields:
+        # Słowniki referencyjne wymagają identyfikatorów użytkownika i projektu
+        fields += [field for field in ('user_id', 'project_id') if field not in fields]
     
-    query = ResourceAllocation.query
+    # Wybrane pola i tryb kompaktowy nie potrzebują zagnieżdżonych obiektów
+    if compact or fields:
+        query = _load_fields(ResourceAllocation.query, ResourceAllocation, fields)
+    else:
+        query = ResourceAllocation.query_with_relations()
     
     if start_date:
         query = query.filter(ResourceAllocation.start_date >= datetime.fromisoformat(start_date).date())
@@ -223,8 +397,16 @@ def get_allocations():
     if project_id:
         query = query.filter_by(project_id=project_id)
     
-    allocations = query.order_by(ResourceAllocation.start_date).all()
-    return jsonify([a.to_dict() for a in allocations])
+    allocations, page = _paginate(query, ResourceAllocation, ResourceAllocation.start_date)
+    
+    if compact:
+        return jsonify({
+            'allocations': [_serialize(a, fields, compact=True) for a in allocations],
+            'users': _lookup_table(User, {a.user_id for a in allocations}),
+            'projects': _lookup_table(Project, {a.project_id for a in allocations}),
+            **(page or {})
+        })
+    return _list_response([_serialize(a, fields) for a in allocations], page)
 
 
 @app.route('/api/allocations', methods=['POST'])
@@ -246,8 +428,13 @@ def create_allocation():
         allocation_percentage=float(data['allocation_percentage']),
         notes=data.get('notes')
     )
+    error = _period_error(allocation.start_date, allocation.end_date)
+    if error:
+        return error
     
     db.session.add(allocation)
+    daily_capacity.refresh_intervals([(allocation.user_id, allocation.start_date, allocation.end_date)])
+    response_cache.invalidate()
     db.session.commit()
     
     return jsonify(allocation.to_dict()), 201
@@ -258,6 +445,7 @@ def update_allocation(allocation_id):
     """Aktualizuje alokację"""
     allocation = ResourceAllocation.query.get_or_404(allocation_id)
     data = request.json
+    previous_span = (allocation.user_id, allocation.start_date, allocation.end_date)
     
     if 'role' in data:
         allocation.role = data['role']
@@ -269,8 +457,17 @@ def update_allocation(allocation_id):
         allocation.allocation_percentage = float(data['allocation_percentage'])
     if 'notes' in data:
         allocation.notes = data['notes']
+    error = _period_error(allocation.start_date, allocation.end_date)
+    if error:
+        db.session.rollback()
+        return error
     
     allocation.updated_at = datetime.utcnow()
+    daily_capacity.refresh_intervals([
+        previous_span,
+        (allocation.user_id, allocation.start_date, allocation.end_date)
+    ])
+    response_cache.invalidate()
     db.session.commit()
     
     return jsonify(allocation.to_dict())
@@ -281,6 +478,8 @@ def delete_allocation(allocation_id):
     """Usuwa alokację"""
     allocation = ResourceAllocation.query.get_or_404(allocation_id)
     db.session.delete(allocation)
+    daily_capacity.refresh_intervals([(allocation.user_id, allocation.start_date, allocation.end_date)])
+    response_cache.invalidate()
     db.session.commit()
     
     return jsonify({'message': 'Alokacja została usunięta'}), 200
@@ -294,8 +493,15 @@ def get_absences():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     user_id = request.args.get('user_id', type=int)
+    compact = request.args.get('compact', 'false').lower() == 'true'
+    fields = _selected_fields(Absence)
+    if compact and fields and 'user_id' not in fields:
+        fields.append('user_id')
     
-    query = Absence.query
+    if compact or fields:
+        query = _load_fields(Absence.query, Absence, fields)
+    else:
+        query = Absence.query_with_relations()
     
     if start_date:
         query = query.filter(Absence.start_date >= datetime.fromisoformat(start_date).date())
@@ -304,8 +510,15 @@ def get_absences():
     if user_id:
         query = query.filter_by(user_id=user_id)
     
-    absences = query.order_by(Absence.start_date).all()
-    return jsonify([a.to_dict() for a in absences])
+    absences, page = _paginate(query, Absence, Absence.start_date)
+    
+    if compact:
+        return jsonify({
+            'absences': [_serialize(a, fields, compact=True) for a in absences],
+            'users': _lookup_table(User, {a.user_id for a in absences}),
+            **(page or {})
+        })
+    return _list_response([_serialize(a, fields) for a in absences], page)
 
 
 @app.route('/api/absences', methods=['POST'])
@@ -326,8 +539,13 @@ def create_absence():
         description=data.get('description'),
         is_approved=data.get('is_approved', False)
     )
+    error = _period_error(absence.start_date, absence.end_date)
+    if error:
+        return error
     
     db.session.add(absence)
+    daily_capacity.refresh_intervals([(absence.user_id, absence.start_date, absence.end_date)])
+    response_cache.invalidate()
     db.session.commit()
     
     return jsonify(absence.to_dict()), 201
@@ -338,6 +556,7 @@ def update_absence(absence_id):
     """Aktualizuje nieobecność"""
     absence = Absence.query.get_or_404(absence_id)
     data = request.json
+    previous_span = (absence.user_id, absence.start_date, absence.end_date)
     
     if 'absence_type' in data:
         absence.absence_type = data['absence_type']
@@ -349,8 +568,17 @@ def update_absence(absence_id):
         absence.description = data['description']
     if 'is_approved' in data:
         absence.is_approved = data['is_approved']
+    error = _period_error(absence.start_date, absence.end_date)
+    if error:
+        db.session.rollback()
+        return error
     
     absence.updated_at = datetime.utcnow()
+    daily_capacity.refresh_intervals([
+        previous_span,
+        (absence.user_id, absence.start_date, absence.end_date)
+    ])
+    response_cache.invalidate()
     db.session.commit()
     
     return jsonify(absence.to_dict())
@@ -361,192 +589,456 @@ def delete_absence(absence_id):
     """Usuwa nieobecność"""
     absence = Absence.query.get_or_404(absence_id)
     db.session.delete(absence)
+    daily_capacity.refresh_intervals([(absence.user_id, absence.start_date, absence.end_date)])
+    response_cache.invalidate()
     db.session.commit()
     
     return jsonify({'message': 'Nieobecność została usunięta'}), 200
 
 
+# ========== Dni wolne (święta) ==========
+
+@app.route('/api/holidays', methods=['GET'])
+def get_holidays():
+    """Pobiera dni wolne, opcjonalnie z zakresu dat"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    query = Holiday.query
+    
+    if start_date:
+        query = query.filter(Holiday.date >= datetime.fromisoformat(start_date).date())
+    if end_date:
+        query = query.filter(Holiday.date <= datetime.fromisoformat(end_date).date())
+    
+    return jsonify([h.to_dict() for h in query.order_by(Holiday.date).all()])
+
+
+@app.route('/api/holidays', methods=['POST'])
+def create_holiday():
+    """Dodaje dzień wolny dla całego zespołu lub jednej strefy czasowej (pole timezone)"""
+    data = request.json
+    
+    if 'date' not in data:
+        return jsonify({'error': 'Brakuje pola: date'}), 400
+    
+    tz_name = data.get('timezone')
+    if tz_name:
+        if not working_calendar.is_valid_timezone(tz_name):
+            return jsonify({'error': f'Nieznana strefa czasowa: {tz_name}'}), 400
+        tz_name = working_calendar.timezone_name(tz_name)
+    
+    holiday_date = datetime.fromisoformat(data['date']).date()
+    if Holiday.query.filter_by(date=holiday_date, timezone=tz_name).first():
+        return jsonify({'error': f'Dzień wolny {holiday_date.isoformat()} już istnieje'}), 400
+    
+    holiday = Holiday(date=holiday_date, name=data.get('name'), timezone=tz_name)
+    db.session.add(holiday)
+    response_cache.invalidate()
+    db.session.commit()
+    
+    return jsonify(holiday.to_dict()), 201
+
+
+@app.route('/api/holidays/<int:holiday_id>', methods=['DELETE'])
+def delete_holiday(holiday_id):
+    """Usuwa dzień wolny"""
+    holiday = Holiday.query.get_or_404(holiday_id)
+    db.session.delete(holiday)
+    response_cache.invalidate()
+    db.session.commit()
+    
+    return jsonify({'message': 'Dzień wolny został usunięty'}), 200
+
+
+# ========== Worklogi ==========
+
+@app.route('/api/worklogs', methods=['GET'])
+def get_worklogs():
+    """Pobiera zsynchronizowane worklogi z lokalnej bazy"""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    user_id = request.args.get('user_id', type=int)
+    
+    query = Worklog.query
+    
+    if start_date:
+        query = query.filter(Worklog.start_date >= datetime.fromisoformat(start_date).date())
+    if end_date:
+        query = query.filter(Worklog.start_date <= datetime.fromisoformat(end_date).date())
+    if user_id:
+        query = query.filter_by(user_id=user_id)
+    
+    worklogs = query.order_by(Worklog.start_date).all()
+    return jsonify([w.to_dict() for w in worklogs])
+
+
 # ========== Kalendarz i analityka ==========
 
 @app.route('/api/calendar', methods=['GET'])
+@response_cache.cached('calendar')
 def get_calendar():
     """Pobiera dane kalendarza dla okresu"""
-    start_date = request.args.get('start_date', datetime.now().strftime('%Y-%m-%d'))
-    end_date = request.args.get('end_date', (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'))
-    
-    start = datetime.fromisoformat(start_date).date()
-    end = datetime.fromisoformat(end_date).date()
+    start, end = _date_range()
+    start_date, end_date = start.isoformat(), end.isoformat()
     
     # Pobierz alokacje
-    allocations = ResourceAllocation.query.filter(
-        ResourceAllocation.start_date <= end,
-        (ResourceAllocation.end_date == None) | (ResourceAllocation.end_date >= start)
-    ).all()
+    allocations = ResourceAllocation.query_with_relations().filter(ResourceAllocation.overlaps(start, end)).all()
     
     # Pobierz nieobecności
-    absences = Absence.query.filter(
-        Absence.start_date <= end,
-        Absence.end_date >= start
-    ).all()
-    
-    # Grupuj dane po datach
-    calendar_data = {}
-    current = start
-    while current <= end:
-        date_str = current.isoformat()
-        calendar_data[date_str] = {
-            'date': date_str,
-            'allocations': [],
-            'absences': []
-        }
-        current += timedelta(days=1)
+    absences = Absence.query_with_relations().filter(Absence.overlaps(start, end)).all()
+    
+    # Macierz obłożenia użytkowników w zakresie dat
+    load = LoadMatrix.build(allocations, absences, start, end)
+    
+    # Dni robocze i "dzisiaj" w strefie oglądającego (parametr timezone)
+    calendar = WorkingCalendar.load(start, end)
+    tz_name = request.args.get('timezone')
     
-    # Dodaj alokacje
+    if request.args.get('format') == 'v2':
+        return jsonify(_calendar_v2_payload(allocations, absences, load, calendar, tz_name))
+    
+    # Grupuj dane po datach (indeks dnia = przesunięcie względem początku zakresu)
+    calendar_data = [
+        {'date': day.isoformat(), 'is_working_day': is_working, 'allocations': [], 'absences': []}
+        for day, is_working in zip(load.dates, calendar.mask(tz_name).tolist())
+    ]
+    
+    # Każdy obiekt serializowany raz i dołączany do kolejnych dni
     for allocation in allocations:
-        alloc_start = max(allocation.start_date, start)
-        alloc_end = min(allocation.end_date, end) if allocation.end_date else end
-        
-        current = alloc_start
-        while current <= alloc_end:
-            date_str = current.isoformat()
-            if date_str in calendar_data:
-                calendar_data[date_str]['allocations'].append(allocation.to_dict())
-            current += timedelta(days=1)
-    
-    # Dodaj nieobecności
+        first = load.day_index(max(allocation.start_date, start))
+        last = load.day_index(min(allocation.end_date, end) if allocation.end_date else end)
+        allocation_data = allocation.to_dict()
+        for day_data in calendar_data[first:last + 1]:
+            day_data['allocations'].append(allocation_data)
+    
     for absence in absences:
-        current = max(absence.start_date, start)
-        while current <= min(absence.end_date, end):
-            date_str = current.isoformat()
-            if date_str in calendar_data:
-                calendar_data[date_str]['absences'].append(absence.to_dict())
-            current += timedelta(days=1)
+        first = load.day_index(max(absence.start_date, start))
+        last = load.day_index(min(absence.end_date, end))
+        absence_data = absence.to_dict()
+        for day_data in calendar_data[first:last + 1]:
+            day_data['absences'].append(absence_data)
     
     return jsonify({
         'start_date': start_date,
         'end_date': end_date,
-        'calendar': list(calendar_data.values())
+        'today': working_calendar.today(tz_name).isoformat(),
+        'calendar': calendar_data,
+        'load': load.to_dict()
     })
 
 
+def _calendar_v2_payload(allocations, absences, load: LoadMatrix,
+                         calendar: WorkingCalendar, tz_name: Optional[str]) -> dict:
+    """Buduje znormalizowaną odpowiedź kalendarza (format v2).
+    
+    Każdy obiekt występuje raz w słownikach referencyjnych, a zajętość dni
+    opisana jest przedziałami [id, od, do] przyciętymi do zakresu oraz
+    seriami obłożenia [od, do, %] per użytkownik. Dni wolne podawane są per
+    strefa czasowa (oglądającego i użytkowników).
+    """
+    start, end = load.start, load.end
+    users = {}
+    projects = {}
+    for allocation in allocations:
+        if allocation.user and allocation.user_id not in users:
+            users[allocation.user_id] = allocation.user.to_dict()
+        if allocation.project and allocation.project_id not in projects:
+            projects[allocation.project_id] = allocation.project.to_dict()
+    for absence in absences:
+        if absence.user and absence.user_id not in users:
+            users[absence.user_id] = absence.user.to_dict()
+    
+    timezones = {working_calendar.timezone_name(tz_name)} | {
+        working_calendar.timezone_name(user['timezone']) for user in users.values()
+    }
+    
+    return {
+        'version': 2,
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'today': working_calendar.today(tz_name).isoformat(),
+        'timezone': working_calendar.timezone_name(tz_name),
+        'non_working_days': {name: calendar.non_working_days(name) for name in sorted(timezones)},
+        'users': users,
+        'projects': projects,
+        'allocations': {a.id: a.to_dict(compact=True) for a in allocations},
+        'absences': {a.id: a.to_dict(compact=True) for a in absences},
+        'intervals': {
+            'allocations': [
+                [a.id, max(a.start_date, start).isoformat(),
+                 (min(a.end_date, end) if a.end_date else end).isoformat()]
+                for a in allocations
+            ],
+            'absences': [
+                [a.id, max(a.start_date, start).isoformat(), min(a.end_date, end).isoformat()]
+                for a in absences
+            ]
+        },
+        'load': load.runs()
+    }
+
+
 @app.route('/api/analytics/overload', methods=['GET'])
+@response_cache.cached('analytics_overload')
 def get_overload_analysis():
     """Analizuje przeciążenia zasobów"""
-    start_date = request.args.get('start_date', datetime.now().strftime('%Y-%m-%d'))
-    end_date = request.args.get('end_date', (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'))
-    
-    start = datetime.fromisoformat(start_date).date()
-    end = datetime.fromisoformat(end_date).date()
+    start, end = _date_range()
+    start_date, end_date = start.isoformat(), end.isoformat()
     
     # Pobierz alokacje
-    allocations = ResourceAllocation.query.filter(
-        ResourceAllocation.start_date <= end,
-        (ResourceAllocation.end_date == None) | (ResourceAllocation.end_date >= start)
-    ).all()
-    
-    # Grupuj po użytkownikach i datach
-    user_days = {}
-    current = start
-    while current <= end:
-        for allocation in allocations:
-            if allocation.start_date <= current <= (allocation.end_date or end):
-                user_id = allocation.user_id
-                date_str = current.isoformat()
-                key = f"{user_id}_{date_str}"
-                
-                if key not in user_days:
-                    user_days[key] = {
-                        'user_id': user_id,
-                        'user': allocation.user.to_dict() if allocation.user else None,
-                        'date': date_str,
-                        'total_allocation': 0,
-                        'allocations': []
-                    }
-                
-                user_days[key]['total_allocation'] += allocation.allocation_percentage
-                user_days[key]['allocations'].append(allocation.to_dict())
-        
-        current += timedelta(days=1)
-    
-    # Wykryj przeciążenia (>100%) i niedobory (<80%)
-    overloaded = []
-    underutilized = []
-    
-    for key, day_data in user_days.items():
-        total = day_data['total_allocation']
-        if total > 100:
-            overloaded.append({
-                **day_data,
-                'overload_percentage': total - 100,
-                'suggestion': f"Zmniejsz alokację o {total - 100:.1f}%"
-            })
-        elif total < 80:
-            underutilized.append({
-                **day_data,
-                'available_capacity': 100 - total,
-                'suggestion': f"Dostępna pojemność: {100 - total:.1f}%"
-            })
+    allocations = ResourceAllocation.query_with_relations().filter(ResourceAllocation.overlaps(start, end)).all()
+    
+    # Dostępność: święta strefy, zatwierdzone nieobecności i godziny pracy alokowanych osób
+    user_ids = {allocation.user_id for allocation in allocations}
+    absences = db.session.query(Absence.user_id, Absence.start_date, Absence.end_date).filter(
+        Absence.user_id.in_(user_ids),
+        Absence.is_approved == True,
+        Absence.overlaps(start, end)
+    ).all() if user_ids else []
+    users = [allocation.user for allocation in allocations if allocation.user]
+    availability = Availability.build(
+        start, end,
+        calendar=WorkingCalendar.load(start, end),
+        absences=absences,
+        work_hours={user.id: user.work_hours_per_day for user in users},
+        timezones={user.id: user.timezone for user in users}
+    )
+    
+    overloaded, underutilized = find_capacity_intervals(allocations, start, end, availability)
+    
+    # Słowniki referencyjne - każdy obiekt serializowany tylko raz
+    referenced_ids = {
+        allocation_id
+        for interval in overloaded + underutilized
+        for allocation_id in interval['allocation_ids']
+    }
+    allocations_by_id = {}
+    users_by_id = {}
+    for allocation in allocations:
+        if allocation.id not in referenced_ids:
+            continue
+        allocations_by_id[allocation.id] = {
+            'id': allocation.id,
+            'user_id': allocation.user_id,
+            'project_id': allocation.project_id,
+            'project_name': allocation.project.name if allocation.project else None,
+            'role': allocation.role,
+            'start_date': allocation.start_date.isoformat() if allocation.start_date else None,
+            'end_date': allocation.end_date.isoformat() if allocation.end_date else None,
+            'allocation_percentage': allocation.allocation_percentage
+        }
+        if allocation.user_id not in users_by_id and allocation.user:
+            users_by_id[allocation.user_id] = allocation.user.to_dict()
     
     return jsonify({
         'start_date': start_date,
         'end_date': end_date,
         'overloaded': overloaded,
         'underutilized': underutilized,
+        'users': users_by_id,
+        'allocations': allocations_by_id,
+        'summary': {
+            'total_overloaded_days': sum(interval['working_days'] for interval in overloaded),
+            'total_underutilized_days': sum(interval['working_days'] for interval in underutilized),
+            'total_overload_hours': round(sum(interval['overload_hours'] for interval in overloaded), 2),
+            'total_free_hours': round(sum(interval['free_hours'] for interval in underutilized), 2),
+            'overloaded_intervals': len(overloaded),
+            'underutilized_intervals': len(underutilized)
+        }
+    })
+
+
+@app.route('/api/analytics/utilization', methods=['GET'])
+@response_cache.cached('analytics_utilization')
+def get_utilization():
+    """Zwraca wykorzystanie zasobów na podstawie tabeli dziennego obłożenia"""
+    start, end = _date_range()
+    start_date, end_date = start.isoformat(), end.isoformat()
+    user_id = request.args.get('user_id', type=int)
+    
+    # Tabelę buduje worker - bez niej wynik byłby zerowy, więc 503 (odpowiedź nie trafia do cache)
+    if not daily_capacity.is_current():
+        return jsonify({'error': 'Tabela dziennego obłożenia nie jest jeszcze zbudowana - spróbuj ponownie później'}), 503
+    
+    users = daily_capacity.utilization(start, end, [user_id] if user_id else None,
+                                       calendar=WorkingCalendar.load(start, end))
+    
+    return jsonify({
+        'start_date': start_date,
+        'end_date': end_date,
+        'users': users,
         'summary': {
-            'total_overloaded_days': len(overloaded),
-            'total_underutilized_days': len(underutilized)
+            'total_capacity_hours': round(sum(u['capacity_hours'] for u in users), 2),
+            'total_available_hours': round(sum(u['available_hours'] for u in users), 2),
+            'overloaded_users': sum(1 for u in users if u['overloaded_days'])
         }
     })
 
 
 # ========== Eksport ==========
 
+# Rozmiar fragmentu przy strumieniowaniu plików eksportu
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _stream_file(file, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Oddaje plik fragmentami i zamyka go po wysłaniu (lub przerwaniu)"""
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+def _file_response(file, mimetype: str, filename: str) -> Response:
+    """Odpowiedź strumieniująca plik tymczasowy eksportu"""
+    # Rozmiar znany z pliku tymczasowego - klient widzi postęp pobierania
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    
+    return Response(
+        _stream_file(file),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Content-Length': str(size)
+        },
+        direct_passthrough=True
+    )
+
+
 @app.route('/api/export/allocations/excel', methods=['GET'])
 def export_allocations_excel():
     """Eksportuje alokacje do Excel"""
-    start_date = request.args.get('start_date', datetime.now().strftime('%Y-%m-%d'))
-    end_date = request.args.get('end_date', (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'))
-    
-    start = datetime.fromisoformat(start_date).date()
-    end = datetime.fromisoformat(end_date).date()
+    start, end = _date_range()
+    start_date, end_date = start.isoformat(), end.isoformat()
     
-    allocations = ResourceAllocation.query.filter(
-        ResourceAllocation.start_date <= end,
-        (ResourceAllocation.end_date == None) | (ResourceAllocation.end_date >= start)
-    ).all()
+    excel_file = ExportService.render_allocations('excel', start, end)
     
-    excel_file = ExportService.export_allocations_excel(allocations, start, end)
-    
-    return Response(
+    return _file_response(
         excel_file,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        headers={'Content-Disposition': f'attachment; filename=allocations_{start_date}_{end_date}.xlsx'}
+        EXPORT_FORMATS['excel'][1],
+        f'allocations_{start_date}_{end_date}.xlsx'
     )
 
 
 @app.route('/api/export/allocations/pdf', methods=['GET'])
+@response_cache.cached('export_allocations_pdf')
 def export_allocations_pdf():
     """Eksportuje alokacje do PDF"""
-    start_date = request.args.get('start_date', datetime.now().strftime('%Y-%m-%d'))
-    end_date = request.args.get('end_date', (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'))
-    
-    start = datetime.fromisoformat(start_date).date()
-    end = datetime.fromisoformat(end_date).date()
+    start, end = _date_range()
+    start_date, end_date = start.isoformat(), end.isoformat()
     
-    allocations = ResourceAllocation.query.filter(
-        ResourceAllocation.start_date <= end,
-        (ResourceAllocation.end_date == None) | (ResourceAllocation.end_date >= start)
-    ).all()
+    group_by = request.args.get('group_by')
+    if group_by and group_by not in PDF_GROUPINGS:
+        return jsonify({'error': f"Nieobsługiwane grupowanie: {group_by}"}), 400
     
-    pdf_file = ExportService.export_allocations_pdf(allocations, start, end)
+    pdf_file = ExportService.render_allocations('pdf', start, end, group_by)
     
     return Response(
-        pdf_file,
+        pdf_file.getvalue(),
         mimetype='application/pdf',
         headers={'Content-Disposition': f'attachment; filename=allocations_{start_date}_{end_date}.pdf'}
     )
 
 
+@app.route('/api/export/heatmap/excel', methods=['GET'])
+def export_heatmap_excel():
+    """Eksportuje mapę dziennego obłożenia (użytkownicy × dni) do Excel"""
+    start, end = _date_range()
+    start_date, end_date = start.isoformat(), end.isoformat()
+    
+    excel_file = ExportService.export_heatmap_excel(start, end)
+    
+    return _file_response(
+        excel_file,
+        EXPORT_FORMATS['excel'][1],
+        f'capacity_heatmap_{start_date}_{end_date}.xlsx'
+    )
+
+
+@app.route('/api/export/heatmap/csv', methods=['GET'])
+def export_heatmap_csv():
+    """Eksportuje mapę dziennego obłożenia do CSV (strumieniowo)"""
+    start, end = _date_range()
+    start_date, end_date = start.isoformat(), end.isoformat()
+    
+    return Response(
+        ExportService.export_heatmap_csv(start, end),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=capacity_heatmap_{start_date}_{end_date}.csv'}
+    )
+
+
+# ========== Eksport w tle ==========
+
+def _export_job_payload(job) -> dict:
+    """Serializuje zadanie eksportu z adresem pobrania gotowego pliku"""
+    data = job.to_dict()
+    data['download_url'] = url_for('download_export_job', job_id=job.id) if job.status == 'done' else None
+    return data
+
+
+@app.route('/api/export/jobs', methods=['POST'])
+def create_export_job():
+    """Zleca eksport alokacji w tle (identyczne zlecenie zwraca istniejący wynik)"""
+    data = request.json or {}
+    export_format = data.get('format')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Nieobsługiwany format: {export_format}"}), 400
+    
+    group_by = data.get('group_by') if export_format == 'pdf' else None
+    if group_by and group_by not in PDF_GROUPINGS:
+        return jsonify({'error': f"Nieobsługiwane grupowanie: {group_by}"}), 400
+    
+    start, end = _date_range(data)
+    
+    job = export_jobs.submit(app, export_format, start, end, group_by)
+    return jsonify(_export_job_payload(job)), 200 if job.status == 'done' else 202
+
+
+@app.route('/api/export/jobs/<int:job_id>', methods=['GET'])
+def get_export_job(job_id):
+    """Zwraca status zadania eksportu"""
+    job = ExportJob.query.get_or_404(job_id)
+    return jsonify(_export_job_payload(job))
+
+
+@app.route('/api/export/jobs/<int:job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    """Pobiera plik gotowego eksportu"""
+    job = ExportJob.query.get_or_404(job_id)
+    if job.status != 'done' or not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': 'Eksport nie jest gotowy'}), 409
+    
+    extension, mimetype = EXPORT_FORMATS[job.export_format]
+    return send_file(
+        job.file_path,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=f"allocations_{job.start_date.isoformat()}_{job.end_date.isoformat()}.{extension}"
+    )
+
+
+# ========== Komendy CLI ==========
+
+@app.cli.command('rebuild-daily-capacity')
+def rebuild_daily_capacity_command():
+    """Przebudowuje tabelę dziennego obłożenia (flask --app backend.app rebuild-daily-capacity)"""
+    written = daily_capacity.materialize(full=True)
+    if written is None:
+        print("⚠ Tabelę dziennego obłożenia buduje teraz inny proces")
+        return
+    response_cache.invalidate()
+    db.session.commit()
+    print(f"✓ Tabela dziennego obłożenia przebudowana: {written} wierszy")
+
+
 # ========== Frontend Routing ==========
 
 @app.route('/', defaults={'path': ''})
@@ -588,12 +1080,15 @@ def serve_frontend(path):
     }), 200
 
 
-# Uruchom scheduler jeśli jest skonfigurowany (tylko w produkcji, nie przy starcie modułu)
-# Scheduler będzie uruchomiony przez gunicorn w produkcji
-# if __name__ == '__main__':
-#     try:
-#         from .scheduler import init_scheduler
-#         scheduler = init_scheduler()
-#     except Exception as e:
-#         print(f"Nie udało się uruchomić schedulera: {e}")
-#     app.run(debug=True, port=5000)
+# Scheduler synchronizacji (SCHEDULER_ENABLED=true). Startuje w każdym procesie WWW, ale
+# blokada i znacznik ostatniego zlecenia sprawiają, że zlecenie do kolejki składa jeden
+# na interwał; wykonuje je backend.worker. Nie startuje przy komendach CLI flaska
+# (flask db, rebuild-daily-capacity, flask run) ani w procesie workera.
+scheduler = None
+if Config.SCHEDULER_ENABLED and not os.environ.get('FLASK_RUN_FROM_CLI') \
+        and not os.environ.get('SYNC_WORKER_PROCESS'):
+    try:
+        from .scheduler import init_scheduler
+        scheduler = init_scheduler(app)
+    except Exception as e:
+        print(f"Nie udało się uruchomić schedulera: {e}")
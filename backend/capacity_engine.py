@@ -0,0 +1,242 @@
+"""Silnik obliczania obłożenia zasobów (sweep po zdarzeniach start/koniec)"""
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .load_matrix import LoadMatrix
+from .models import ResourceAllocation, Absence
+from .working_calendar import WorkingCalendar
+
+# Progi klasyfikacji obłożenia (w procentach)
+OVERLOAD_THRESHOLD = 100.0
+UNDERUTILIZATION_THRESHOLD = 80.0
+
+# Godziny pracy użytkownika bez ustawionego work_hours_per_day
+DEFAULT_WORK_HOURS = 8.0
+
+
+def _prefix_sum(mask: np.ndarray) -> np.ndarray:
+    return np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+
+
+class Availability:
+    """Bitmapy dni pracy użytkowników w zakresie dat.
+    
+    Dzień roboczy wynika z maski kalendarza strefy użytkownika (bez weekendów
+    i świąt). Dzień dostępny to dzień roboczy bez zatwierdzonej nieobecności.
+    Sumy prefiksowe masek pozwalają policzyć dni (i godziny) w dowolnym
+    podprzedziale w czasie stałym; maski współdzielone przez strefę liczone są raz.
+    """
+    
+    def __init__(self, start: date, end: date, default_working: np.ndarray,
+                 working_by_user: Dict[int, np.ndarray], user_ids: List[int],
+                 absence: np.ndarray, work_hours: Dict[int, float]):
+        self.start = start
+        self.end = end
+        self.absence = absence
+        self.work_hours = work_hours
+        self._row_by_user = {user_id: row for row, user_id in enumerate(user_ids)}
+        
+        prefixes = {id(default_working): _prefix_sum(default_working)}
+        self._default_prefix = prefixes[id(default_working)]
+        self._working_prefix: Dict[int, np.ndarray] = {}
+        for user_id, mask in working_by_user.items():
+            if id(mask) not in prefixes:
+                prefixes[id(mask)] = _prefix_sum(mask)
+            self._working_prefix[user_id] = prefixes[id(mask)]
+        
+        self._available_prefix = {
+            user_id: _prefix_sum(working_by_user.get(user_id, default_working) & ~absence[row])
+            for user_id, row in self._row_by_user.items()
+        }
+    
+    @classmethod
+    def build(cls, start: date, end: date,
+              calendar: Optional[WorkingCalendar] = None,
+              absences: Iterable[Absence] = (),
+              work_hours: Optional[Dict[int, float]] = None,
+              timezones: Optional[Dict[int, Optional[str]]] = None) -> 'Availability':
+        """Buduje bitmapy z kalendarza świąt, zatwierdzonych nieobecności, godzin i stref pracy"""
+        calendar = calendar or WorkingCalendar(start, end)
+        absences = list(absences)
+        user_ids = sorted({absence.user_id for absence in absences})
+        absence_matrix = LoadMatrix.build((), absences, start, end, user_ids=user_ids).absence
+        return cls(start, end, calendar.mask(), calendar.masks(timezones or {}),
+                   user_ids, absence_matrix, work_hours or {})
+    
+    def hours_per_day(self, user_id: int) -> float:
+        hours = self.work_hours.get(user_id)
+        return hours if hours is not None else DEFAULT_WORK_HOURS
+    
+    @staticmethod
+    def _count(prefix: np.ndarray, first_offset: int, last_offset: int) -> int:
+        return int(prefix[last_offset + 1] - prefix[first_offset])
+    
+    def working_days(self, user_id: int, first: date, last: date) -> int:
+        """Liczba dni roboczych użytkownika w [first, last]"""
+        prefix = self._working_prefix.get(user_id, self._default_prefix)
+        return self._count(prefix, (first - self.start).days, (last - self.start).days)
+    
+    def available_days(self, user_id: int, first: date, last: date) -> int:
+        """Liczba dni roboczych w [first, last], w których użytkownik jest obecny"""
+        prefix = self._available_prefix.get(user_id)
+        if prefix is None:
+            return self.working_days(user_id, first, last)
+        return self._count(prefix, (first - self.start).days, (last - self.start).days)
+    
+    def breakpoints(self, user_id: int) -> List[date]:
+        """Dni, w których zmienia się obecność użytkownika (początek lub koniec nieobecności)"""
+        row = self._row_by_user.get(user_id)
+        if row is None:
+            return []
+        absent = self.absence[row]
+        offsets = np.flatnonzero(absent[1:] != absent[:-1]) + 1
+        return [self.start + timedelta(days=offset) for offset in offsets.tolist()]
+
+
+def build_user_events(allocations: Iterable[ResourceAllocation],
+                      start: date,
+                      end: date) -> Dict[int, List[Tuple[date, float, int]]]:
+    """Buduje posortowane zdarzenia delta (data, zmiana %, id alokacji) per użytkownik.
+    
+    Alokacja przycięta do zakresu [start, end] generuje zdarzenie +% w dniu
+    rozpoczęcia i -% w dniu następującym po zakończeniu.
+    """
+    events: Dict[int, List[Tuple[date, float, int]]] = {}
+    
+    for allocation in allocations:
+        alloc_start = max(allocation.start_date, start)
+        alloc_end = min(allocation.end_date, end) if allocation.end_date else end
+        if alloc_start > alloc_end:
+            continue
+        
+        percentage = allocation.allocation_percentage or 0.0
+        user_events = events.setdefault(allocation.user_id, [])
+        user_events.append((alloc_start, percentage, allocation.id))
+        user_events.append((alloc_end + timedelta(days=1), -percentage, allocation.id))
+    
+    for user_events in events.values():
+        user_events.sort(key=lambda event: event[0])
+    
+    return events
+
+
+def sweep_user_events(events: List[Tuple[date, float, int]]) -> List[Dict]:
+    """Przechodzi raz po zdarzeniach użytkownika i zwraca odcinki o stałym obłożeniu.
+    
+    Każdy odcinek to słownik z kluczami start, end (włącznie), total_allocation
+    i allocation_ids. Dni bez żadnej aktywnej alokacji są pomijane.
+    """
+    segments = []
+    active: Dict[int, float] = {}
+    total = 0.0
+    index = 0
+    
+    while index < len(events):
+        current = events[index][0]
+        
+        # Zastosuj wszystkie zdarzenia z tego samego dnia
+        while index < len(events) and events[index][0] == current:
+            _, delta, allocation_id = events[index]
+            if delta >= 0 and allocation_id not in active:
+                active[allocation_id] = delta
+                total += delta
+            elif allocation_id in active and delta <= 0:
+                total -= active.pop(allocation_id)
+            index += 1
+        
+        if not active or index >= len(events):
+            continue
+        
+        segments.append({
+            'start': current,
+            'end': events[index][0] - timedelta(days=1),
+            'total_allocation': round(total, 4),
+            'allocation_ids': sorted(active)
+        })
+    
+    return segments
+
+
+def split_segment(segment: Dict, breakpoints: List[date]) -> List[Dict]:
+    """Dzieli odcinek o stałym obłożeniu w dniach zmiany obecności użytkownika"""
+    pieces = []
+    first = segment['start']
+    for breakpoint in breakpoints[bisect_right(breakpoints, first):]:
+        if breakpoint > segment['end']:
+            break
+        pieces.append({**segment, 'start': first, 'end': breakpoint - timedelta(days=1)})
+        first = breakpoint
+    pieces.append({**segment, 'start': first})
+    return pieces
+
+
+def find_capacity_intervals(allocations: Iterable[ResourceAllocation],
+                            start: date,
+                            end: date,
+                            availability: Optional[Availability] = None,
+                            overload_threshold: float = OVERLOAD_THRESHOLD,
+                            underutilization_threshold: float = UNDERUTILIZATION_THRESHOLD
+                            ) -> Tuple[List[Dict], List[Dict]]:
+    """Wyznacza ciągłe przedziały przeciążeń i niedoborów w zakresie dat.
+    
+    Zwraca krotkę (overloaded, underutilized). Odcinki o stałej sumie alokacji
+    dzielone są w granicach nieobecności, a obłożenie liczone jest w godzinach:
+    alokacja dotyczy dni roboczych (bez weekendów i świąt), a dostępne są
+    tylko dni robocze bez nieobecności. Odcinki bez dni roboczych są pomijane.
+    Złożoność jest liniowa względem liczby alokacji i nieobecności.
+    """
+    if availability is None:
+        availability = Availability.build(start, end)
+    
+    overloaded = []
+    underutilized = []
+    
+    for user_id, events in build_user_events(allocations, start, end).items():
+        hours_per_day = availability.hours_per_day(user_id)
+        breakpoints = availability.breakpoints(user_id)
+        
+        for segment in sweep_user_events(events):
+            for piece in split_segment(segment, breakpoints):
+                working_days = availability.working_days(user_id, piece['start'], piece['end'])
+                if not working_days:
+                    continue
+                
+                total = piece['total_allocation']
+                available_hours = availability.available_days(user_id, piece['start'], piece['end']) * hours_per_day
+                allocated_hours = round(total / 100 * working_days * hours_per_day, 2)
+                interval = {
+                    'user_id': user_id,
+                    'start_date': piece['start'].isoformat(),
+                    'end_date': piece['end'].isoformat(),
+                    'days': (piece['end'] - piece['start']).days + 1,
+                    'working_days': working_days,
+                    'total_allocation': total,
+                    'allocated_hours': allocated_hours,
+                    'available_hours': available_hours,
+                    'allocation_ids': piece['allocation_ids']
+                }
+                
+                overload_hours = allocated_hours - available_hours * overload_threshold / 100
+                if overload_hours > 0:
+                    overloaded.append({
+                        **interval,
+                        'overload_hours': round(overload_hours, 2),
+                        'suggestion': (
+                            f"Nieobecność - przenieś {overload_hours:.1f} h pracy"
+                            if not available_hours else
+                            f"Zmniejsz obciążenie o {overload_hours:.1f} h"
+                        )
+                    })
+                elif allocated_hours < available_hours * underutilization_threshold / 100:
+                    underutilized.append({
+                        **interval,
+                        'free_hours': round(available_hours - allocated_hours, 2),
+                        'suggestion': f"Dostępna pojemność: {available_hours - allocated_hours:.1f} h"
+                    })
+    
+    overloaded.sort(key=lambda item: (item['start_date'], item['user_id']))
+    underutilized.sort(key=lambda item: (item['start_date'], item['user_id']))
+    return overloaded, underutilized
@@ -1,5 +1,6 @@
 """Konfiguracja aplikacji"""
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Załaduj zmienne środowiskowe
@@ -25,12 +26,58 @@ class Config:
     JIRA_URL = os.getenv('JIRA_URL')
     JIRA_EMAIL = os.getenv('JIRA_EMAIL')
     JIRA_API_TOKEN = os.getenv('JIRA_API_TOKEN')
+    JIRA_USERS_PAGE_SIZE = int(os.getenv('JIRA_USERS_PAGE_SIZE', '50'))
+    JIRA_MAX_CONCURRENCY = int(os.getenv('JIRA_MAX_CONCURRENCY', '4'))  # Maks. liczba równoległych żądań
     
     # Tempo Configuration
     TEMPO_API_TOKEN = os.getenv('TEMPO_API_TOKEN')
+    # Plik z wykrytymi endpointami Tempo (pusty = tylko w pamięci) i czas ich ważności
+    TEMPO_ENDPOINT_CACHE_FILE = os.getenv(
+        'TEMPO_ENDPOINT_CACHE_FILE',
+        os.path.join(tempfile.gettempdir(), 'tempo_endpoints.json')
+    )
+    TEMPO_ENDPOINT_CACHE_TTL = int(os.getenv('TEMPO_ENDPOINT_CACHE_TTL', '86400'))
+    TEMPO_PAGE_SIZE = int(os.getenv('TEMPO_PAGE_SIZE', '1000'))
+    # Zakres pierwszej synchronizacji worklogów (później tylko zmiany od ostatniej)
+    TEMPO_WORKLOG_INITIAL_DAYS = int(os.getenv('TEMPO_WORKLOG_INITIAL_DAYS', '90'))
+    
+    # HTTP (pula połączeń i ponawianie żądań do Jira/Tempo)
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))
+    HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.5'))
+    HTTP_TIMEOUT = int(os.getenv('HTTP_TIMEOUT', '30'))
     
     # Sync Configuration
     SYNC_INTERVAL_MINUTES = int(os.getenv('SYNC_INTERVAL_MINUTES', '60'))
+    SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', '500'))  # Rozmiar paczek przy zapisie hurtowym
+    SYNC_PROJECT_MEMBERS = os.getenv('SYNC_PROJECT_MEMBERS', 'false').lower() == 'true'
+    # Scheduler w procesie aplikacji; zadanie wykonuje tylko proces trzymający blokadę,
+    # a dzierżawa (bazy bez advisory lock) wygasa po SCHEDULER_LOCK_TTL sekundach
+    SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', 'false').lower() == 'true'
+    SCHEDULER_LOCK_TTL = int(os.getenv('SCHEDULER_LOCK_TTL', '7200'))
+    # Worker synchronizacji - co ile sekund sprawdzać kolejkę i po ilu sekundach
+    # uruchomione zadanie uznać za porzucone
+    SYNC_WORKER_POLL_SECONDS = float(os.getenv('SYNC_WORKER_POLL_SECONDS', '5'))
+    SYNC_JOB_TIMEOUT = int(os.getenv('SYNC_JOB_TIMEOUT', '7200'))
+    
+    # Tabela dziennego obłożenia - na ile dni w przód materializować alokacje bezterminowe
+    DAILY_CAPACITY_HORIZON_DAYS = int(os.getenv('DAILY_CAPACITY_HORIZON_DAYS', '365'))
+    
+    # Eksport w tle - katalog na gotowe pliki, liczba wątków renderujących,
+    # po ilu sekundach niezakończone zadanie uznać za porzucone i ile godzin trzymać wyniki
+    EXPORT_STORAGE_DIR = os.getenv(
+        'EXPORT_STORAGE_DIR',
+        os.path.join(tempfile.gettempdir(), 'capacity_exports')
+    )
+    EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '2'))
+    EXPORT_JOB_TIMEOUT = int(os.getenv('EXPORT_JOB_TIMEOUT', '1800'))
+    EXPORT_RETENTION_HOURS = int(os.getenv('EXPORT_RETENTION_HOURS', '24'))
+    
+    # Cache odpowiedzi (memory = LRU w procesie, redis = współdzielony między workerami)
+    CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '256'))
+    CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '300'))
+    REDIS_URL = os.getenv('REDIS_URL')
     
     # Timezone
     DEFAULT_TIMEZONE = os.getenv('DEFAULT_TIMEZONE', 'Europe/Warsaw')
@@ -0,0 +1,264 @@
+"""Utrzymanie zmaterializowanej tabeli dziennego obłożenia (daily_capacity)"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, case, func
+
+from .config import Config
+from .job_lock import job_lock
+from .load_matrix import LoadMatrix
+from .models import db, User, ResourceAllocation, Absence, DailyCapacity, SyncState
+from . import working_calendar
+
+# Klucz SyncState z datą, do której tabela została zmaterializowana
+HORIZON_KEY = 'daily_capacity_horizon'
+
+# Blokada budowy tabeli (worker, komenda CLI)
+MATERIALIZE_LOCK_NAME = 'daily_capacity'
+
+# Liczba użytkowników przeliczanych jednocześnie (ogranicza rozmiar macierzy)
+USER_CHUNK_SIZE = 50
+
+
+def target_horizon() -> date:
+    """Ostatni dzień materializowany dla alokacji bezterminowych"""
+    return working_calendar.today() + timedelta(days=Config.DAILY_CAPACITY_HORIZON_DAYS)
+
+
+def stored_horizon() -> Optional[date]:
+    """Zwraca datę, do której tabela jest zmaterializowana (None - nigdy nie zbudowana)"""
+    value = SyncState.get_value(HORIZON_KEY)
+    return date.fromisoformat(value) if value else None
+
+
+def _earliest_date(user_ids: List[int]) -> Optional[date]:
+    """Najwcześniejsza data alokacji lub nieobecności podanych użytkowników"""
+    dates = [
+        db.session.query(func.min(ResourceAllocation.start_date))
+        .filter(ResourceAllocation.user_id.in_(user_ids)).scalar(),
+        db.session.query(func.min(Absence.start_date))
+        .filter(Absence.user_id.in_(user_ids), Absence.is_approved == True).scalar(),
+    ]
+    dates = [d for d in dates if d is not None]
+    return min(dates) if dates else None
+
+
+def _refresh_chunk(user_ids: List[int], start: Optional[date], end: date) -> int:
+    """Przelicza wiersze paczki użytkowników w zakresie [start, end]"""
+    rows = DailyCapacity.query.filter(DailyCapacity.user_id.in_(user_ids))
+    if start is None:
+        # Pełne przeliczenie - od najwcześniejszych danych, usuwane są wszystkie wiersze
+        rows.delete(synchronize_session=False)
+        start = _earliest_date(user_ids)
+        if start is None or start > end:
+            return 0
+    else:
+        rows.filter(DailyCapacity.date.between(start, end)).delete(synchronize_session=False)
+    
+    # Tylko kolumny potrzebne do zbudowania macierzy, bez obiektów ORM
+    allocations = db.session.query(
+        ResourceAllocation.user_id,
+        ResourceAllocation.start_date,
+        ResourceAllocation.end_date,
+        ResourceAllocation.allocation_percentage
+    ).filter(
+        ResourceAllocation.user_id.in_(user_ids),
+        ResourceAllocation.overlaps(start, end)
+    ).all()
+    absences = db.session.query(
+        Absence.user_id,
+        Absence.start_date,
+        Absence.end_date
+    ).filter(
+        Absence.user_id.in_(user_ids),
+        Absence.is_approved == True,
+        Absence.overlaps(start, end)
+    ).all()
+    work_hours = dict(
+        db.session.query(User.id, User.work_hours_per_day).filter(User.id.in_(user_ids)).all()
+    )
+    
+    load = LoadMatrix.build(allocations, absences, start, end, user_ids=user_ids)
+    # Zapisywane są tylko dni z alokacją lub nieobecnością
+    rows_idx, days_idx = np.nonzero((load.allocation != 0) | load.absence)
+    if not len(rows_idx):
+        return 0
+    
+    mappings = []
+    for row, day in zip(rows_idx.tolist(), days_idx.tolist()):
+        user_id = load.user_ids[row]
+        allocated = float(load.allocation[row, day])
+        absent = bool(load.absence[row, day])
+        hours = work_hours.get(user_id) or 8.0
+        mappings.append({
+            'user_id': user_id,
+            'date': start + timedelta(days=day),
+            'allocated_pct': allocated,
+            'absent': absent,
+            'available_hours': 0.0 if absent else hours * max(0.0, 100.0 - allocated) / 100.0
+        })
+    db.session.bulk_insert_mappings(DailyCapacity, mappings)
+    return len(mappings)
+
+
+def refresh_span(user_ids: Iterable[int], start: Optional[date] = None,
+                 end: Optional[date] = None) -> int:
+    """Przelicza dzienne obłożenie użytkowników w zakresie dat (bez commita).
+    
+    ``start=None`` oznacza pełne przeliczenie od najwcześniejszych danych,
+    ``end=None`` - do horyzontu materializacji. Zwraca liczbę zapisanych wierszy.
+    """
+    user_ids = sorted(set(user_ids))
+    horizon = target_horizon()
+    end = min(end, horizon) if end else horizon
+    if not user_ids or (start is not None and start > end):
+        return 0
+    
+    db.session.flush()
+    written = 0
+    for index in range(0, len(user_ids), USER_CHUNK_SIZE):
+        written += _refresh_chunk(user_ids[index:index + USER_CHUNK_SIZE], start, end)
+    return written
+
+
+def refresh_intervals(intervals: Iterable[Tuple[int, date, Optional[date]]]) -> int:
+    """Przelicza zakresy dotknięte zapisem: (user_id, od, do lub None dla bezterminowych).
+    
+    Zakresy jednego użytkownika (np. stary i nowy zakres edytowanej alokacji)
+    są łączone w jeden.
+    """
+    if stored_horizon() is None:
+        # Tabela nie została jeszcze zbudowana - zbuduje ją materialize()
+        return 0
+    
+    spans: Dict[int, Tuple[date, Optional[date]]] = {}
+    for user_id, start, end in intervals:
+        if user_id is None or start is None:
+            continue
+        if user_id in spans:
+            current_start, current_end = spans[user_id]
+            start = min(start, current_start)
+            end = None if end is None or current_end is None else max(end, current_end)
+        spans[user_id] = (start, end)
+    
+    return sum(refresh_span([user_id], start, end) for user_id, (start, end) in spans.items())
+
+
+def rebuild() -> int:
+    """Przebudowuje całą tabelę od zera (bez commita)"""
+    DailyCapacity.query.delete(synchronize_session=False)
+    user_ids = {user_id for (user_id,) in db.session.query(ResourceAllocation.user_id).distinct()}
+    user_ids |= {user_id for (user_id,) in db.session.query(Absence.user_id).distinct()}
+    written = refresh_span(user_ids)
+    SyncState.set_value(HORIZON_KEY, target_horizon().isoformat())
+    return written
+
+
+def is_current() -> bool:
+    """Czy tabela jest zbudowana i sięga bieżącego horyzontu"""
+    horizon = stored_horizon()
+    return horizon is not None and horizon >= target_horizon()
+
+
+def materialize(full: bool = False) -> Optional[int]:
+    """Buduje tabelę, gdy jeszcze nie istnieje, i przesuwa horyzont wraz z upływem dni.
+    
+    Wywoływane przez worker i komendę CLI, nigdy w trakcie żądania. Blokada
+    sprawia, że przebudowę wykonuje jeden proces naraz. full=True wymusza
+    pełną przebudowę. Zwraca liczbę zapisanych wierszy albo None, gdy nie
+    było nic do zrobienia lub tabelę buduje inny proces; błąd jest
+    zgłaszany dalej po wycofaniu transakcji.
+    """
+    with job_lock(MATERIALIZE_LOCK_NAME) as acquired:
+        if not acquired:
+            return None
+        horizon = None if full else stored_horizon()
+        target = target_horizon()
+        if horizon is not None and horizon >= target:
+            return None
+        
+        try:
+            if horizon is None:
+                written = rebuild()
+            else:
+                # Nowe dni za horyzontem dotyczą tylko danych sięgających poza niego
+                start = horizon + timedelta(days=1)
+                user_ids = {user_id for (user_id,) in db.session.query(ResourceAllocation.user_id).filter(
+                    ResourceAllocation.overlaps(start)
+                ).distinct()}
+                user_ids |= {user_id for (user_id,) in db.session.query(Absence.user_id).filter(
+                    Absence.overlaps(start)
+                ).distinct()}
+                written = refresh_span(user_ids, start, target)
+                SyncState.set_value(HORIZON_KEY, target.isoformat())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    print(f"✓ Tabela dziennego obłożenia zmaterializowana do {target} ({written} wierszy)")
+    return written
+
+
+def utilization(start: date, end: date, user_ids: Optional[List[int]] = None,
+                overload_threshold: float = 100,
+                calendar: Optional[working_calendar.WorkingCalendar] = None) -> List[Dict]:
+    """Zwraca wykorzystanie użytkowników w zakresie dat (agregacja po tabeli).
+    
+    Liczone są tylko dni robocze ze strefy czasowej użytkownika. Dni
+    nieobecności nie są dniami przeciążenia (jak w analizie przeciążeń), nawet
+    przy alokacji ponad próg. Użytkownicy o tej samej masce dni roboczych
+    agregowani są jednym zapytaniem.
+    """
+    if (end - start).days < 0:
+        return []
+    calendar = calendar or working_calendar.WorkingCalendar(start, end)
+    
+    users = User.query.filter(User.is_active == True)
+    if user_ids:
+        users = users.filter(User.id.in_(user_ids))
+    users = users.all()
+    masks = calendar.masks({user.id: user.timezone for user in users})
+    
+    aggregates = {}
+    for mask in {id(mask): mask for mask in masks.values()}.values():
+        working_dates = [start + timedelta(days=offset) for offset in np.flatnonzero(mask).tolist()]
+        if not working_dates:
+            continue
+        mask_user_ids = [user_id for user_id, user_mask in masks.items() if user_mask is mask]
+        query = db.session.query(
+            DailyCapacity.user_id,
+            func.count(DailyCapacity.date),
+            func.sum(DailyCapacity.allocated_pct),
+            func.sum(case((and_(DailyCapacity.allocated_pct > overload_threshold,
+                                DailyCapacity.absent == False), 1), else_=0)),
+            func.sum(case((DailyCapacity.absent == True, 1), else_=0)),
+            func.sum(DailyCapacity.available_hours)
+        ).filter(DailyCapacity.date.in_(working_dates))
+        if user_ids:
+            query = query.filter(DailyCapacity.user_id.in_(mask_user_ids))
+        rows = query.group_by(DailyCapacity.user_id).all()
+        aggregates.update({row[0]: row[1:] for row in rows if masks.get(row[0]) is mask})
+    
+    result = []
+    for user in users:
+        days = int(masks[user.id].sum())
+        stored_days, allocated_sum, overloaded_days, absent_days, available_sum = \
+            aggregates.get(user.id, (0, 0.0, 0, 0, 0.0))
+        hours = user.work_hours_per_day or 8.0
+        # Dni robocze bez wiersza są w pełni dostępne
+        available_hours = (available_sum or 0.0) + (days - stored_days) * hours
+        result.append({
+            'user_id': user.id,
+            'display_name': user.display_name,
+            'days': days,
+            'average_allocation': round((allocated_sum or 0.0) / days, 2) if days else 0.0,
+            'overloaded_days': int(overloaded_days or 0),
+            'absent_days': int(absent_days or 0),
+            'capacity_hours': round(days * hours, 2),
+            'available_hours': round(available_hours, 2)
+        })
+    
+    result.sort(key=lambda item: item['average_allocation'], reverse=True)
+    return result
@@ -0,0 +1,132 @@
+"""Eksport raportów w tle - zadania renderowane przez pulę wątków do plików na dysku"""
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from typing import Optional
+
+from .config import Config
+from .export_service import ExportService, EXPORT_FORMATS
+from .models import db, ExportJob
+from .response_cache import response_cache
+
+# Zadania w tych stanach mogą jeszcze dać wynik
+ACTIVE_STATUSES = ('pending', 'running')
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Zwraca pulę wątków renderujących (tworzoną przy pierwszym zleceniu)"""
+    global _executor
+    
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.EXPORT_WORKERS, thread_name_prefix='export')
+    return _executor
+
+
+def params_key(export_format: str, start: date, end: date, group_by: Optional[str] = None) -> str:
+    """Klucz deduplikacji - zmiana danych (nowa generacja cache) daje nowy klucz"""
+    return f"{export_format}:{start.isoformat()}:{end.isoformat()}:{group_by or ''}:{response_cache.generation()}"
+
+
+def _is_reusable(job: ExportJob) -> bool:
+    """Czy zadanie nadal prowadzi (lub doprowadziło) do aktualnego pliku"""
+    if job.status == 'done':
+        return bool(job.file_path) and os.path.exists(job.file_path)
+    if job.status in ACTIVE_STATUSES:
+        # Zadanie procesu, który zginął w trakcie, nie blokuje nowych zleceń
+        return job.created_at >= datetime.utcnow() - timedelta(seconds=Config.EXPORT_JOB_TIMEOUT)
+    return False
+
+
+def cleanup_expired():
+    """Usuwa pliki i zadania starsze niż EXPORT_RETENTION_HOURS (bez commita)"""
+    threshold = datetime.utcnow() - timedelta(hours=Config.EXPORT_RETENTION_HOURS)
+    expired = ExportJob.query.filter(
+        ExportJob.created_at < threshold,
+        ExportJob.status.notin_(ACTIVE_STATUSES)
+    ).all()
+    
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            try:
+                os.remove(job.file_path)
+            except OSError as e:
+                print(f"Nie udało się usunąć pliku eksportu {job.file_path}: {e}")
+        db.session.delete(job)
+
+
+def submit(app, export_format: str, start: date, end: date,
+           group_by: Optional[str] = None) -> ExportJob:
+    """Zleca eksport lub zwraca istniejące zadanie dla tych samych parametrów i danych"""
+    key = params_key(export_format, start, end, group_by)
+    existing = ExportJob.query.filter_by(params_key=key).order_by(ExportJob.id.desc()).first()
+    if existing is not None and _is_reusable(existing):
+        return existing
+    
+    cleanup_expired()
+    job = ExportJob(
+        params_key=key,
+        export_format=export_format,
+        start_date=start,
+        end_date=end,
+        group_by=group_by,
+        status='pending'
+    )
+    db.session.add(job)
+    db.session.commit()
+    
+    _get_executor().submit(_run_job, app, job.id)
+    return job
+
+
+def _run_job(app, job_id: int):
+    """Renderuje raport zadania do pliku w EXPORT_STORAGE_DIR"""
+    with app.app_context():
+        job = db.session.get(ExportJob, job_id)
+        if job is None:
+            return
+        
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+        
+        temp_path = None
+        try:
+            extension, _ = EXPORT_FORMATS[job.export_format]
+            os.makedirs(Config.EXPORT_STORAGE_DIR, exist_ok=True)
+            path = os.path.join(Config.EXPORT_STORAGE_DIR, f"export_{job.id}.{extension}")
+            temp_path = f"{path}.tmp"
+            
+            # Plik pojawia się pod docelową nazwą dopiero w całości
+            output = ExportService.render_allocations(
+                job.export_format, job.start_date, job.end_date, job.group_by
+            )
+            with output, open(temp_path, 'wb') as target:
+                shutil.copyfileobj(output, target)
+            os.replace(temp_path, path)
+            
+            job.file_path = path
+            job.status = 'done'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            print(f"✓ Eksport {job_id} gotowy: {path}")
+        
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ExportJob, job_id)
+            job.status = 'error'
+            job.error_message = str(e)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            print(f"Błąd podczas eksportu {job_id}: {e}")
+        
+        finally:
+            # Niedokończony plik po błędzie renderowania lub zapisu (cleanup_expired go nie zna)
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -1,141 +1,505 @@
 """Serwis eksportu danych do PDF i Excel"""
+import csv
+import tempfile
+from xml.sax.saxutils import escape
 from datetime import datetime, date
-from io import BytesIO
-from typing import List, Dict
+from io import BytesIO, StringIO
+from typing import IO, Iterable, Iterator, List, Dict, Optional, Tuple
+import numpy as np
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import ColorScaleRule
 from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.utils import get_column_letter
+from sqlalchemy import func
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
 
-from .models import ResourceAllocation, Absence, User, Project
+from .models import db, ResourceAllocation, Absence, User, Project
+from .load_matrix import LoadMatrix
+
+
+# Liczba wierszy pobieranych z bazy naraz przy eksporcie strumieniowym
+EXPORT_FETCH_SIZE = 1000
+
+# Maksymalna szerokość kolumny w arkuszu
+MAX_COLUMN_WIDTH = 50
+
+# Obsługiwane formaty eksportu: format -> (rozszerzenie pliku, typ MIME)
+EXPORT_FORMATS = {
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'pdf': ('pdf', 'application/pdf'),
+}
+
+# Mapa obłożenia: oznaczenie dnia nieobecności i liczba wierszy CSV wysyłanych naraz
+HEATMAP_ABSENCE_MARK = 'N'
+HEATMAP_CSV_CHUNK_ROWS = 100
+
+# Grupowanie raportu PDF (parametr group_by)
+PDF_GROUPINGS = ('user', 'project')
+
+# Liczba wierszy w jednej tabeli PDF - koszt układu tabeli rośnie szybciej niż liniowo
+PDF_CHUNK_ROWS = 200
+
+# Stałe szerokości kolumn tabeli alokacji (Użytkownik, Projekt, Rola, Alokacja %, Okres)
+# - suma równa szerokości strony A4 bez domyślnych marginesów
+PDF_COLUMN_WIDTHS = [105, 110, 80, 56, 100]
+PDF_FONT_SIZE = 9
+PDF_CELL_PADDING = 6
+
+_styles = getSampleStyleSheet()
+
+PDF_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_styles['Heading1'],
+    fontSize=24,
+    textColor=colors.HexColor('#366092'),
+    spaceAfter=30,
+    alignment=1  # Center
+)
+PDF_NORMAL_STYLE = _styles['Normal']
+PDF_HEADING_STYLE = _styles['Heading2']
+PDF_GROUP_STYLE = _styles['Heading3']
+
+PDF_ALLOCATION_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#366092')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTSIZE', (0, 1), (-1, -1), PDF_FONT_SIZE),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
+])
+
+PDF_SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#366092')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
+])
+
+
+class _LazyStory(list):
+    """Lista elementów PDF uzupełniana z generatora w trakcie składu.
+    
+    ReportLab zdejmuje elementy z początku listy, więc wystarczy trzymać
+    kilka następnych (zapas dla keepWithNext).
+    """
+    
+    LOOKAHEAD = 2
+    
+    def __init__(self, source: Iterator):
+        super().__init__()
+        self._source = source
+    
+    def _fill(self):
+        while list.__len__(self) < self.LOOKAHEAD:
+            item = next(self._source, None)
+            if item is None:
+                break
+            self.append(item)
+    
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+    
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
 
 
 class ExportService:
     """Serwis do eksportu danych"""
     
+    ALLOCATION_HEADERS = ['Użytkownik', 'Projekt', 'Rola', 'Data rozpoczęcia', 'Data zakończenia',
+                          'Alokacja %', 'Notatki']
+    
+    LOAD_SUMMARY_HEADERS = ['Użytkownik', 'Średnia alokacja %', 'Maks. alokacja %',
+                            'Dni przeciążenia', 'Dni nieobecności']
+    
+    @staticmethod
+    def _load_summary_rows(load: LoadMatrix) -> List[List]:
+        """Przygotowuje wiersze podsumowania obłożenia z macierzy"""
+        names = {
+            user.id: user.display_name
+            for user in User.query.filter(User.id.in_(load.user_ids)).all()
+        } if load.user_ids else {}
+        
+        return [
+            [
+                names.get(item['user_id'], ''),
+                item['average_allocation'],
+                item['max_allocation'],
+                item['overloaded_days'],
+                item['absent_days']
+            ]
+            for item in load.summary()
+        ]
+    
+    @staticmethod
+    def build_load_matrix(start_date: date, end_date: date,
+                          extra_user_ids: Iterable[int] = ()) -> LoadMatrix:
+        """Buduje macierz obłożenia z kolumn okresów czytanych strumieniowo.
+        
+        Jak w analizie przeciążeń i tabeli daily_capacity liczą się tylko
+        zatwierdzone nieobecności. extra_user_ids dodaje wiersze użytkowników
+        bez alokacji i nieobecności.
+        """
+        allocations = db.session.query(
+            ResourceAllocation.user_id,
+            ResourceAllocation.start_date,
+            ResourceAllocation.end_date,
+            ResourceAllocation.allocation_percentage
+        ).filter(ResourceAllocation.overlaps(start_date, end_date))
+        absences = db.session.query(
+            Absence.user_id,
+            Absence.start_date,
+            Absence.end_date
+        ).filter(Absence.is_approved == True, Absence.overlaps(start_date, end_date))
+        user_ids = sorted(
+            {user_id for (user_id,) in allocations.with_entities(ResourceAllocation.user_id).distinct()} |
+            {user_id for (user_id,) in absences.with_entities(Absence.user_id).distinct()} |
+            set(extra_user_ids)
+        )
+        
+        return LoadMatrix.build(
+            allocations.yield_per(EXPORT_FETCH_SIZE),
+            absences.yield_per(EXPORT_FETCH_SIZE),
+            start_date, end_date, user_ids=user_ids
+        )
+    
+    @staticmethod
+    def render_allocations(export_format: str, start_date: date, end_date: date,
+                           group_by: Optional[str] = None) -> IO[bytes]:
+        """Renderuje raport alokacji w podanym formacie (klucz EXPORT_FORMATS).
+        
+        group_by (user/project) dotyczy tylko raportu PDF.
+        """
+        load = ExportService.build_load_matrix(start_date, end_date)
+        if export_format == 'excel':
+            return ExportService.export_allocations_excel(start_date, end_date, load)
+        return ExportService.export_allocations_pdf(start_date, end_date, load, group_by)
+    
+    # ========== Mapa obłożenia (użytkownicy × dni) ==========
+    
+    @staticmethod
+    def _heatmap_grid(start_date: date, end_date: date) -> Tuple[List[str], List[date], np.ndarray, np.ndarray]:
+        """Zwraca (nazwy, daty, obłożenie, nieobecności) z wierszami posortowanymi po nazwie.
+        
+        Obejmuje wszystkich aktywnych użytkowników oraz tych, którzy mają dane
+        w zakresie. Wartości pochodzą z jednej macierzy LoadMatrix.
+        """
+        active_ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.is_active == True)]
+        load = ExportService.build_load_matrix(start_date, end_date, extra_user_ids=active_ids)
+        names = dict(
+            db.session.query(User.id, User.display_name).filter(User.id.in_(load.user_ids)).all()
+        ) if load.user_ids else {}
+        
+        user_names = [names.get(user_id) or '' for user_id in load.user_ids]
+        order = sorted(range(len(user_names)), key=lambda row: user_names[row].lower())
+        return (
+            [user_names[row] for row in order],
+            load.dates,
+            np.round(load.allocation[order], 1),
+            load.absence[order]
+        )
+    
+    @staticmethod
+    def export_heatmap_excel(start_date: date, end_date: date) -> IO[bytes]:
+        """Eksportuje mapę obłożenia (użytkownicy × dni) do Excel.
+        
+        Kolory nadaje formatowanie warunkowe (skala 0% - 100% - 150%), więc
+        komórki z wartościami nie są stylowane pojedynczo. Dni nieobecności
+        oznaczone są literą N na szarym tle.
+        """
+        names, dates, values, absences = ExportService._heatmap_grid(start_date, end_date)
+        
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Obłożenie dzienne")
+        ws.freeze_panes = 'B2'
+        ws.column_dimensions['A'].width = 30
+        if dates:
+            day_columns = ws.column_dimensions['B']
+            day_columns.min, day_columns.max, day_columns.width = 2, len(dates) + 1, 11
+        if names and dates:
+            ws.conditional_formatting.add(
+                f"B2:{get_column_letter(len(dates) + 1)}{len(names) + 1}",
+                ColorScaleRule(
+                    start_type='num', start_value=0, start_color='FFFFFF',
+                    mid_type='num', mid_value=100, mid_color='63BE7B',
+                    end_type='num', end_value=150, end_color='F8696B'
+                )
+            )
+        
+        ws.append(ExportService._header_cells(ws, ['Użytkownik'] + [day.isoformat() for day in dates]))
+        absence_fill = PatternFill(start_color="BFBFBF", end_color="BFBFBF", fill_type="solid")
+        for name, row, absent in zip(names, values.tolist(), absences):
+            for day in np.flatnonzero(absent).tolist():
+                cell = WriteOnlyCell(ws, value=HEATMAP_ABSENCE_MARK)
+                cell.fill = absence_fill
+                row[day] = cell
+            ws.append([name] + row)
+        
+        output = tempfile.TemporaryFile()
+        wb.save(output)
+        output.seek(0)
+        return output
+    
     @staticmethod
-    def export_allocations_excel(allocations: List[ResourceAllocation], 
-                                 start_date: date, 
-                                 end_date: date) -> BytesIO:
-        """Eksportuje alokacje do Excel"""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Alokacje zasobów"
+    def export_heatmap_csv(start_date: date, end_date: date) -> Iterator[str]:
+        """Eksportuje mapę obłożenia do CSV jako strumień fragmentów tekstu.
         
-        # Nagłówki
-        headers = ['Użytkownik', 'Projekt', 'Rola', 'Data rozpoczęcia', 'Data zakończenia', 
-                  'Alokacja %', 'Notatki']
-        ws.append(headers)
+        Dane są wyliczane od razu (w kontekście żądania), a zwracany generator
+        jedynie formatuje kolejne paczki wierszy.
+        """
+        names, dates, values, absences = ExportService._heatmap_grid(start_date, end_date)
+        # Formatowanie wartości całej macierzy naraz
+        cells = np.where(absences, HEATMAP_ABSENCE_MARK, np.char.mod('%g', values)).tolist()
+        header = ['Użytkownik'] + [day.isoformat() for day in dates]
+        return ExportService._csv_chunks(header, names, cells)
+    
+    @staticmethod
+    def _csv_chunks(header: List[str], names: List[str], cells: List[List[str]]) -> Iterator[str]:
+        """Składa wiersze CSV w paczki po HEATMAP_CSV_CHUNK_ROWS"""
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        # BOM - Excel rozpoznaje wtedy kodowanie UTF-8
+        buffer.write('\ufeff')
+        writer.writerow(header)
+        for index, (name, row) in enumerate(zip(names, cells), start=1):
+            writer.writerow([name] + row)
+            if index % HEATMAP_CSV_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    # ========== Alokacje ==========
+    
+    @staticmethod
+    def _allocation_export_query(start_date: date, end_date: date):
+        """Zapytanie o kolumny eksportu alokacji (bez obiektów ORM)"""
+        return db.session.query(
+            User.display_name,
+            Project.name,
+            ResourceAllocation.role,
+            ResourceAllocation.start_date,
+            ResourceAllocation.end_date,
+            ResourceAllocation.allocation_percentage,
+            ResourceAllocation.notes
+        ).outerjoin(User, ResourceAllocation.user_id == User.id).outerjoin(
+            Project, ResourceAllocation.project_id == Project.id
+        ).filter(ResourceAllocation.overlaps(start_date, end_date))
+    
+    @staticmethod
+    def _allocation_rows(start_date: date, end_date: date) -> Iterator[List]:
+        """Strumień wierszy arkusza alokacji pobieranych partiami z bazy"""
+        query = ExportService._allocation_export_query(start_date, end_date).order_by(
+            ResourceAllocation.start_date, ResourceAllocation.id
+        ).yield_per(EXPORT_FETCH_SIZE)
+        
+        for user_name, project_name, role, start, end, percentage, notes in query:
+            yield [
+                user_name or '',
+                project_name or '',
+                role or '',
+                start.isoformat() if start else '',
+                end.isoformat() if end else 'Bezterminowo',
+                f"{percentage}%",
+                notes or ''
+            ]
+    
+    @staticmethod
+    def _allocation_column_widths(start_date: date, end_date: date) -> List[int]:
+        """Wylicza szerokości kolumn z najdłuższych wartości (agregat SQL).
         
-        # Styl nagłówków
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
+        W trybie write-only szerokości muszą być znane przed pierwszym
+        wierszem, więc długości tekstów liczy baza zamiast drugiego przebiegu.
+        """
+        lengths = ExportService._allocation_export_query(start_date, end_date).with_entities(
+            func.max(func.length(User.display_name)),
+            func.max(func.length(Project.name)),
+            func.max(func.length(ResourceAllocation.role)),
+            func.max(func.length(ResourceAllocation.notes))
+        ).one()
+        user_length, project_length, role_length, notes_length = (length or 0 for length in lengths)
         
-        for cell in ws[1]:
-            cell.fill = header_fill
-            cell.font = header_font
+        # Daty i procenty mają stałą długość - decyduje nagłówek
+        data_lengths = [user_length, project_length, role_length,
+                        len('YYYY-MM-DD'), len('Bezterminowo'), len('100.0%'), notes_length]
+        return [
+            min(max(len(header), length) + 2, MAX_COLUMN_WIDTH)
+            for header, length in zip(ExportService.ALLOCATION_HEADERS, data_lengths)
+        ]
+    
+    @staticmethod
+    def _header_cells(ws, headers: List[str]) -> List[WriteOnlyCell]:
+        """Tworzy ostylowane komórki nagłówka dla arkusza write-only"""
+        cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+            cell.font = Font(bold=True, color="FFFFFF")
             cell.alignment = Alignment(horizontal="center", vertical="center")
+            cells.append(cell)
+        return cells
+    
+    @staticmethod
+    def export_allocations_excel(start_date: date,
+                                 end_date: date,
+                                 load: Optional[LoadMatrix] = None) -> IO[bytes]:
+        """Eksportuje alokacje do Excel w trybie strumieniowym (write-only).
+        
+        Wiersze pobierane są z bazy partiami i od razu zapisywane do arkusza,
+        a gotowy plik trafia do pliku tymczasowego (zwracanego od początku).
+        """
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Alokacje zasobów")
+        
+        for index, width in enumerate(ExportService._allocation_column_widths(start_date, end_date), start=1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+        
+        ws.append(ExportService._header_cells(ws, ExportService.ALLOCATION_HEADERS))
+        for row in ExportService._allocation_rows(start_date, end_date):
+            ws.append(row)
+        
+        # Podsumowanie obłożenia z macierzy dziennej
+        if load is not None:
+            summary_ws = wb.create_sheet("Obłożenie")
+            summary_ws.column_dimensions['A'].width = 30
+            for column_letter in 'BCDE':
+                summary_ws.column_dimensions[column_letter].width = 20
+            summary_ws.append(ExportService._header_cells(summary_ws, ExportService.LOAD_SUMMARY_HEADERS))
+            for row in ExportService._load_summary_rows(load):
+                summary_ws.append(row)
         
-        # Dane
-        for allocation in allocations:
-            ws.append([
-                allocation.user.display_name if allocation.user else '',
-                allocation.project.name if allocation.project else '',
-                allocation.role or '',
-                allocation.start_date.isoformat() if allocation.start_date else '',
-                allocation.end_date.isoformat() if allocation.end_date else 'Bezterminowo',
-                f"{allocation.allocation_percentage}%",
-                allocation.notes or ''
-            ])
-        
-        # Auto-width kolumn
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Zapisz do BytesIO
-        output = BytesIO()
+        output = tempfile.TemporaryFile()
         wb.save(output)
         output.seek(0)
         return output
     
     @staticmethod
-    def export_allocations_pdf(allocations: List[ResourceAllocation],
-                               start_date: date,
-                               end_date: date) -> BytesIO:
-        """Eksportuje alokacje do PDF"""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        story = []
-        styles = getSampleStyleSheet()
+    def _fit_text(text: str, width: float, font_name: str = 'Helvetica',
+                  font_size: float = PDF_FONT_SIZE) -> str:
+        """Skraca tekst do szerokości kolumny (stałe szerokości nie zawijają treści)"""
+        available = width - PDF_CELL_PADDING * 2
+        if stringWidth(text, font_name, font_size) <= available:
+            return text
+        while text and stringWidth(text + '…', font_name, font_size) > available:
+            text = text[:-1]
+        return text + '…'
+    
+    @staticmethod
+    def _pdf_allocation_rows(start_date: date, end_date: date,
+                             group_by: Optional[str] = None) -> Iterator[tuple]:
+        """Strumień (grupa, wiersz tabeli PDF) posortowany według grupy"""
+        query = ExportService._allocation_export_query(start_date, end_date)
+        if group_by == 'user':
+            query = query.order_by(User.display_name, Project.name, ResourceAllocation.start_date)
+        elif group_by == 'project':
+            query = query.order_by(Project.name, User.display_name, ResourceAllocation.start_date)
+        else:
+            query = query.order_by(ResourceAllocation.start_date, ResourceAllocation.id)
         
+        fit = ExportService._fit_text
+        user_width, project_width, role_width, _, period_width = PDF_COLUMN_WIDTHS
+        for user_name, project_name, role, start, end, percentage, _ in query.yield_per(EXPORT_FETCH_SIZE):
+            period = f"{start.isoformat()} - {end.isoformat() if end else 'Bezterminowo'}"
+            group = {'user': user_name, 'project': project_name}.get(group_by) or ''
+            yield group, [
+                fit(user_name or '', user_width),
+                fit(project_name or '', project_width),
+                fit(role or '', role_width),
+                f"{percentage}%",
+                fit(period, period_width)
+            ]
+    
+    @staticmethod
+    def _pdf_tables(rows: List[List]) -> List[Table]:
+        """Dzieli wiersze na tabele o stałym rozmiarze z powtarzanym nagłówkiem"""
+        header = ['Użytkownik', 'Projekt', 'Rola', 'Alokacja %', 'Okres']
+        return [
+            Table(
+                [header] + rows[index:index + PDF_CHUNK_ROWS],
+                colWidths=PDF_COLUMN_WIDTHS,
+                repeatRows=1,
+                style=PDF_ALLOCATION_TABLE_STYLE
+            )
+            for index in range(0, len(rows), PDF_CHUNK_ROWS)
+        ]
+    
+    @staticmethod
+    def _pdf_story(start_date: date,
+                   end_date: date,
+                   load: Optional[LoadMatrix] = None,
+                   group_by: Optional[str] = None) -> Iterator:
+        """Generuje kolejne elementy raportu PDF (tabele powstają w trakcie składu)"""
         # Tytuł
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#366092'),
-            spaceAfter=30,
-            alignment=1  # Center
-        )
-        story.append(Paragraph("Raport alokacji zasobów", title_style))
-        story.append(Spacer(1, 0.2*inch))
+        yield Paragraph("Raport alokacji zasobów", PDF_TITLE_STYLE)
+        yield Spacer(1, 0.2*inch)
         
         # Okres
         period_text = f"Okres: {start_date.isoformat()} - {end_date.isoformat()}"
-        story.append(Paragraph(period_text, styles['Normal']))
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Tabela
-        data = [['Użytkownik', 'Projekt', 'Rola', 'Alokacja %', 'Okres']]
-        
-        for allocation in allocations:
-            period = f"{allocation.start_date.isoformat()}"
-            if allocation.end_date:
-                period += f" - {allocation.end_date.isoformat()}"
-            else:
-                period += " - Bezterminowo"
-            
-            data.append([
-                allocation.user.display_name if allocation.user else '',
-                allocation.project.name if allocation.project else '',
-                allocation.role or '',
-                f"{allocation.allocation_percentage}%",
-                period
-            ])
-        
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#366092')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
-        ]))
-        
-        story.append(table)
+        yield Paragraph(period_text, PDF_NORMAL_STYLE)
+        yield Spacer(1, 0.3*inch)
+        
+        # Tabele alokacji (w sekcjach przy grupowaniu)
+        current_group, rows = None, []
+        for group, row in ExportService._pdf_allocation_rows(start_date, end_date, group_by):
+            if group_by and group != current_group:
+                yield from ExportService._pdf_tables(rows)
+                rows = []
+                current_group = group
+                yield Paragraph(escape(group or 'Brak'), PDF_GROUP_STYLE)
+            rows.append(row)
+            if len(rows) == PDF_CHUNK_ROWS:
+                yield from ExportService._pdf_tables(rows)
+                rows = []
+        yield from ExportService._pdf_tables(rows)
+        
+        # Podsumowanie obłożenia z macierzy dziennej
+        if load is not None:
+            yield Spacer(1, 0.3*inch)
+            yield Paragraph("Podsumowanie obłożenia", PDF_HEADING_STYLE)
+            summary_rows = ExportService._load_summary_rows(load)
+            for index in range(0, max(len(summary_rows), 1), PDF_CHUNK_ROWS):
+                yield Table(
+                    [ExportService.LOAD_SUMMARY_HEADERS] + summary_rows[index:index + PDF_CHUNK_ROWS],
+                    repeatRows=1,
+                    style=PDF_SUMMARY_TABLE_STYLE
+                )
         
         # Stopka
-        story.append(Spacer(1, 0.3*inch))
+        yield Spacer(1, 0.3*inch)
         footer_text = f"Wygenerowano: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        story.append(Paragraph(footer_text, styles['Normal']))
+        yield Paragraph(footer_text, PDF_NORMAL_STYLE)
+    
+    @staticmethod
+    def export_allocations_pdf(start_date: date,
+                               end_date: date,
+                               load: Optional[LoadMatrix] = None,
+                               group_by: Optional[str] = None) -> BytesIO:
+        """Eksportuje alokacje do PDF.
         
-        doc.build(story)
+        Wiersze trafiają do tabel po PDF_CHUNK_ROWS, ze stałymi szerokościami
+        kolumn i współdzielonymi stylami, więc czas składu rośnie liniowo.
+        Tabele tworzone są dopiero, gdy skład do nich dojdzie, więc w pamięci
+        jest ich najwyżej kilka naraz. group_by='user' lub 'project' dzieli
+        raport na sekcje z nagłówkami.
+        """
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=A4)
+        doc.build(_LazyStory(ExportService._pdf_story(start_date, end_date, load, group_by)))
         buffer.seek(0)
         return buffer
 
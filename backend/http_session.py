@@ -0,0 +1,55 @@
+"""Współdzielona sesja HTTP z pulą połączeń i ponawianiem żądań"""
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import Config
+
+# Statusy, przy których żądanie jest ponawiane (limit zapytań i błędy serwera)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_shared_session: Optional[requests.Session] = None
+_shared_session_lock = threading.Lock()
+
+
+def create_session(pool_size: Optional[int] = None,
+                   max_retries: Optional[int] = None,
+                   backoff_factor: Optional[float] = None) -> requests.Session:
+    """Tworzy sesję keep-alive z pulą połączeń i wykładniczym ponawianiem.
+    
+    Przy odpowiedziach 429/5xx nagłówek Retry-After ma pierwszeństwo przed
+    wyliczonym opóźnieniem. Po wyczerpaniu prób zwracana jest ostatnia odpowiedź,
+    więc wywołujący nadal obsługuje błąd przez raise_for_status().
+    """
+    pool_size = pool_size or Config.HTTP_POOL_SIZE
+    max_retries = Config.HTTP_MAX_RETRIES if max_retries is None else max_retries
+    backoff_factor = Config.HTTP_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+    
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_shared_session() -> requests.Session:
+    """Zwraca sesję współdzieloną przez klientów Jira i Tempo w obrębie procesu"""
+    global _shared_session
+    
+    if _shared_session is None:
+        with _shared_session_lock:
+            if _shared_session is None:
+                _shared_session = create_session()
+    return _shared_session
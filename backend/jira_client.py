@@ -1,30 +1,90 @@
 """Klient do komunikacji z Jira API"""
+import hashlib
+import json
+import threading
 import requests
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from typing import Any, List, Dict, Optional, Tuple
 from datetime import datetime
+from .config import Config
+from .http_session import get_shared_session
 
 
 class JiraClient:
     """Klient do komunikacji z Jira API"""
     
-    def __init__(self, base_url: str, email: str, api_token: str):
+    def __init__(self, base_url: str, email: str, api_token: str,
+                 session: Optional[requests.Session] = None):
         self.base_url = base_url.rstrip('/')
         self.email = email
         self.api_token = api_token
         self.auth = (email, api_token)
         self.api_url = f"{self.base_url}/rest/api/3"
+        self.session = session or get_shared_session()
+        self.timeout = Config.HTTP_TIMEOUT
+        self.users_page_size = Config.JIRA_USERS_PAGE_SIZE
+        self.max_concurrency = max(1, Config.JIRA_MAX_CONCURRENCY)
+        # Walidatory odpowiedzi (ETag/Last-Modified) i skróty treści rekordów z ostatniej synchronizacji
+        self._validators: Dict[str, Tuple[Dict[str, str], Any]] = {}
+        self._content_hashes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+    
+    def _get_conditional(self, url: str, params: Optional[Dict] = None) -> Any:
+        """Wykonuje GET warunkowy (If-None-Match / If-Modified-Since).
+        
+        Przy odpowiedzi 304 zwracana jest zapamiętana treść poprzedniej odpowiedzi.
+        """
+        cache_key = f"{url}?{json.dumps(params or {}, sort_keys=True)}"
+        cached = self._validators.get(cache_key)
+        headers = cached[0] if cached else {}
+        
+        response = self.session.get(url, auth=self.auth, params=params, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+        data = response.json()
+        
+        validators = {}
+        if response.headers.get('ETag'):
+            validators['If-None-Match'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = response.headers['Last-Modified']
+        if validators:
+            self._validators[cache_key] = (validators, data)
+        else:
+            self._validators.pop(cache_key, None)
+        return data
+    
+    @staticmethod
+    def content_hash(item: Dict) -> str:
+        """Liczy skrót treści rekordu z Jiry"""
+        return hashlib.sha1(json.dumps(item, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    
+    def filter_changed(self, kind: str, items: List[Dict], key_field: str) -> Tuple[List[Dict], Dict[str, str]]:
+        """Zwraca rekordy, których treść zmieniła się od ostatniej synchronizacji.
+        
+        Drugi element wyniku to nowe skróty - należy je przekazać do
+        remember_hashes() dopiero po udanym zapisie w bazie.
+        """
+        changed = []
+        pending = {}
+        for item in items:
+            key = f"{kind}:{item.get(key_field)}"
+            digest = self.content_hash(item)
+            if self._content_hashes.get(key) != digest:
+                changed.append(item)
+                pending[key] = digest
+        return changed, pending
+    
+    def remember_hashes(self, hashes: Dict[str, str]):
+        """Zapamiętuje skróty treści zapisanych rekordów"""
+        with self._lock:
+            self._content_hashes.update(hashes)
     
     def get_projects(self) -> List[Dict]:
         """Pobiera listę wszystkich projektów"""
         try:
-            response = requests.get(
-                f"{self.api_url}/project",
-                auth=self.auth,
-                params={'expand': 'description,lead'},
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._get_conditional(f"{self.api_url}/project", params={'expand': 'description,lead'})
         except Exception as e:
             print(f"Błąd podczas pobierania projektów: {e}")
             return []
@@ -32,11 +92,11 @@ class JiraClient:
     def get_project(self, project_key: str) -> Optional[Dict]:
         """Pobiera szczegóły projektu"""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.api_url}/project/{project_key}",
                 auth=self.auth,
                 params={'expand': 'description,lead'},
-                timeout=30
+                timeout=self.timeout
             )
             response.raise_for_status()
             return response.json()
@@ -44,63 +104,110 @@ class JiraClient:
             print(f"Błąd podczas pobierania projektu {project_key}: {e}")
             return None
     
+    def _fetch_project_users(self, project_key: str) -> List[Dict]:
+        """Pobiera aktorów roli 'Users' projektu (zgłasza wyjątek przy błędzie)"""
+        response = self.session.get(
+            f"{self.api_url}/project/{project_key}/role",
+            auth=self.auth,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        roles = response.json()
+        
+        users = []
+        if 'Users' in roles:
+            users_url = roles['Users']
+            users_response = self.session.get(users_url, auth=self.auth, timeout=self.timeout)
+            users_response.raise_for_status()
+            users_data = users_response.json()
+            users = users_data.get('actors', [])
+        
+        return users
+    
     def get_project_users(self, project_key: str) -> List[Dict]:
         """Pobiera użytkowników przypisanych do projektu"""
         try:
-            response = requests.get(
-                f"{self.api_url}/project/{project_key}/role",
-                auth=self.auth,
-                timeout=30
-            )
-            response.raise_for_status()
-            roles = response.json()
-            
-            users = []
-            if 'Users' in roles:
-                users_url = roles['Users']
-                users_response = requests.get(users_url, auth=self.auth, timeout=30)
-                users_response.raise_for_status()
-                users_data = users_response.json()
-                users = users_data.get('actors', [])
-            
-            return users
+            return self._fetch_project_users(project_key)
         except Exception as e:
             print(f"Błąd podczas pobierania użytkowników projektu {project_key}: {e}")
             return []
     
+    def get_users_for_projects(self, project_keys: List[str]) -> Dict[str, List[Dict]]:
+        """Pobiera użytkowników wielu projektów równolegle (maks. JIRA_MAX_CONCURRENCY naraz).
+        
+        Zwraca mapowanie klucz projektu -> lista aktorów. Projekty, których nie
+        udało się pobrać, są pomijane w wyniku (a nie zwracane jako puste).
+        """
+        result = {}
+        
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = {
+                executor.submit(self._fetch_project_users, project_key): project_key
+                for project_key in dict.fromkeys(project_keys)
+            }
+            for future in as_completed(futures):
+                project_key = futures[future]
+                try:
+                    result[project_key] = future.result()
+                except Exception as e:
+                    print(f"Błąd podczas pobierania użytkowników projektu {project_key}: {e}")
+        
+        return result
+    
+    def _get_users_page(self, start_at: int, max_results: int) -> List[Dict]:
+        """Pobiera jedną stronę użytkowników z /users/search"""
+        response = self.session.get(
+            f"{self.api_url}/users/search",
+            auth=self.auth,
+            params={
+                'startAt': start_at,
+                'maxResults': max_results,
+                'active': True
+            },
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+    
     def get_all_users(self) -> List[Dict]:
-        """Pobiera wszystkich aktywnych użytkowników z Jira"""
+        """Pobiera wszystkich aktywnych użytkowników z Jira.
+        
+        Strony pobierane są równolegle w ograniczonym oknie (JIRA_MAX_CONCURRENCY).
+        Pierwsza niepełna strona kończy wysyłanie kolejnych żądań, a wyniki
+        składane są w kolejności stron.
+        """
         try:
-            users = []
-            start_at = 0
-            max_results = 50
+            max_results = self.users_page_size
+            pages = {}
+            last_page = None  # indeks pierwszej niepełnej strony
+            next_page = 0
             
-            while True:
-                response = requests.get(
-                    f"{self.api_url}/users/search",
-                    auth=self.auth,
-                    params={
-                        'startAt': start_at,
-                        'maxResults': max_results,
-                        'active': True
-                    },
-                    timeout=30
-                )
-                response.raise_for_status()
-                batch = response.json()
-                
-                if not batch:
-                    break
-                
-                active_users = [u for u in batch if u.get('active', True)]
-                users.extend(active_users)
-                start_at += max_results
-                
-                if len(batch) < max_results:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                in_flight = {}
+                while True:
+                    while len(in_flight) < self.max_concurrency and (last_page is None or next_page <= last_page):
+                        future = executor.submit(self._get_users_page, next_page * max_results, max_results)
+                        in_flight[future] = next_page
+                        next_page += 1
+                    
+                    if not in_flight:
+                        break
+                    
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        page = in_flight.pop(future)
+                        batch = future.result()
+                        pages[page] = batch
+                        if len(batch) < max_results and (last_page is None or page < last_page):
+                            last_page = page
+            
+            users = []
+            for page in sorted(pages):
+                if last_page is not None and page > last_page:
                     break
+                users.extend(u for u in pages[page] if u.get('active', True))
             
             return users
         except Exception as e:
             print(f"Błąd podczas pobierania użytkowników: {e}")
             return []
-
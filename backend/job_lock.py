@@ -0,0 +1,107 @@
+"""Blokada zadań cyklicznych między procesami (wybór lidera dla schedulera)
+
+W PostgreSQL zadanie chroni advisory lock trzymany na osobnym połączeniu -
+zwalnia się sam, gdy proces zginie. W pozostałych bazach (SQLite) rolę
+blokady pełni wiersz dzierżawy w tabeli job_leases z czasem wygaśnięcia.
+"""
+import os
+import socket
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from sqlalchemy import insert, text, update
+from sqlalchemy.exc import IntegrityError
+
+from .config import Config
+from .models import db, JobLease
+
+# Identyfikator procesu jako właściciela dzierżawy
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _advisory_key(name: str) -> int:
+    """Stały klucz advisory lock wyliczony z nazwy zadania"""
+    return zlib.crc32(name.encode('utf-8'))
+
+
+@contextmanager
+def _advisory_lock(name: str) -> Iterator[bool]:
+    connection = db.engine.connect()
+    try:
+        acquired = connection.execute(
+            text('SELECT pg_try_advisory_lock(:key)'), {'key': _advisory_key(name)}
+        ).scalar()
+        connection.commit()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': _advisory_key(name)})
+                connection.commit()
+    finally:
+        connection.close()
+
+
+def _acquire_lease(name: str, ttl: int) -> bool:
+    """Przejmuje wygasłą dzierżawę albo zakłada nową"""
+    now = datetime.utcnow()
+    table = JobLease.__table__
+    with db.engine.begin() as connection:
+        # Warunkowy UPDATE jest atomowy - przy wyścigu tylko jeden proces zmieni wiersz
+        taken = connection.execute(
+            update(table)
+            .where(table.c.name == name, table.c.expires_at < now)
+            .values(owner=OWNER_ID, expires_at=now + timedelta(seconds=ttl), acquired_at=now)
+        ).rowcount
+    if taken:
+        return True
+    
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(
+                insert(table).values(name=name, owner=OWNER_ID,
+                                     expires_at=now + timedelta(seconds=ttl), acquired_at=now)
+            )
+        return True
+    except IntegrityError:
+        # Wiersz istnieje i dzierżawa jest ważna - zadanie wykonuje inny proces
+        return False
+
+
+def _release_lease(name: str):
+    table = JobLease.__table__
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(table)
+            .where(table.c.name == name, table.c.owner == OWNER_ID)
+            .values(expires_at=datetime.utcnow())
+        )
+
+
+@contextmanager
+def _lease_lock(name: str, ttl: int) -> Iterator[bool]:
+    acquired = _acquire_lease(name, ttl)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            _release_lease(name)
+
+
+@contextmanager
+def job_lock(name: str, ttl: Optional[int] = None) -> Iterator[bool]:
+    """Próbuje (bez czekania) przejąć blokadę zadania; zwraca, czy się udało.
+    
+    ttl (sekundy, domyślnie SCHEDULER_LOCK_TTL) dotyczy tylko dzierżawy w
+    tabeli - po tym czasie blokadę porzuconą przez martwy proces przejmie
+    kolejny. Musi więc przekraczać czas najdłuższego wykonania zadania.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        with _advisory_lock(name) as acquired:
+            yield acquired
+    else:
+        with _lease_lock(name, ttl or Config.SCHEDULER_LOCK_TTL) as acquired:
+            yield acquired
@@ -0,0 +1,161 @@
+"""Macierz dziennego obłożenia użytkowników (użytkownicy × dni)"""
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .models import ResourceAllocation, Absence
+
+
+class LoadMatrix:
+    """Gęsta macierz obłożenia zbudowana z alokacji i nieobecności.
+    
+    Wiersze odpowiadają użytkownikom (``user_ids``), kolumny kolejnym dniom
+    zakresu [start, end]. ``allocation`` zawiera sumę procentów alokacji
+    (float64, z dokładnością do setnych), ``absence`` informację o
+    nieobecności w danym dniu (bool).
+    """
+    
+    def __init__(self, user_ids: List[int], start: date, end: date,
+                 allocation: np.ndarray, absence: np.ndarray):
+        self.user_ids = user_ids
+        self.start = start
+        self.end = end
+        self.allocation = allocation
+        self.absence = absence
+        self._row_by_user = {user_id: row for row, user_id in enumerate(user_ids)}
+    
+    @classmethod
+    def build(cls, allocations: Iterable[ResourceAllocation],
+              absences: Iterable[Absence],
+              start: date,
+              end: date,
+              user_ids: Optional[Iterable[int]] = None) -> 'LoadMatrix':
+        """Buduje macierz w jednym przebiegu po danych.
+        
+        Każdy przedział zamieniany jest na znaczniki +wartość w dniu rozpoczęcia
+        i -wartość w dniu po zakończeniu, a obłożenie dzienne to suma skumulowana
+        znaczników wzdłuż osi dni.
+        """
+        if user_ids is None:
+            allocations = list(allocations)
+            absences = list(absences)
+            user_ids = sorted({a.user_id for a in allocations} | {a.user_id for a in absences})
+        else:
+            # Przy znanych użytkownikach dane mogą być strumieniem (np. yield_per)
+            user_ids = list(user_ids)
+        row_by_user = {user_id: row for row, user_id in enumerate(user_ids)}
+        days = max((end - start).days + 1, 0)
+        
+        alloc_rows, alloc_starts, alloc_ends, alloc_values = cls._markers(
+            allocations, row_by_user, start, end, days
+        )
+        # Procenty sumowane są w setnych jako liczby całkowite - suma skumulowana jest
+        # dokładna, więc po końcu alokacji obłożenie wraca dokładnie do zera
+        markers = np.zeros((len(user_ids), days + 1), dtype=np.int64)
+        values = np.rint(np.asarray(alloc_values, dtype=np.float64) * 100).astype(np.int64)
+        np.add.at(markers, (alloc_rows, alloc_starts), values)
+        np.add.at(markers, (alloc_rows, alloc_ends), -values)
+        allocation = np.cumsum(markers[:, :-1], axis=1) / 100.0
+        
+        abs_rows, abs_starts, abs_ends, _ = cls._markers(
+            absences, row_by_user, start, end, days
+        )
+        counters = np.zeros((len(user_ids), days + 1), dtype=np.int32)
+        np.add.at(counters, (abs_rows, abs_starts), 1)
+        np.add.at(counters, (abs_rows, abs_ends), -1)
+        absence = np.cumsum(counters[:, :-1], axis=1) > 0
+        
+        return cls(user_ids, start, end, allocation, absence)
+    
+    @staticmethod
+    def _markers(items, row_by_user: Dict[int, int], start: date, end: date, days: int):
+        """Zamienia przedziały dat na indeksy (wiersz, początek, koniec wyłącznie, wartość)"""
+        rows, starts, ends, values = [], [], [], []
+        
+        for item in items:
+            row = row_by_user.get(item.user_id)
+            if row is None:
+                continue
+            item_start = max(item.start_date, start)
+            item_end = min(item.end_date, end) if item.end_date else end
+            if item_start > item_end:
+                continue
+            
+            rows.append(row)
+            starts.append((item_start - start).days)
+            ends.append(min((item_end - start).days + 1, days))
+            values.append(getattr(item, 'allocation_percentage', None) or 0.0)
+        
+        return (np.asarray(rows, dtype=np.intp), np.asarray(starts, dtype=np.intp),
+                np.asarray(ends, dtype=np.intp), values)
+    
+    @property
+    def days(self) -> int:
+        return self.allocation.shape[1]
+    
+    @property
+    def dates(self) -> List[date]:
+        return [self.start + timedelta(days=offset) for offset in range(self.days)]
+    
+    def day_index(self, day: date) -> int:
+        """Zwraca indeks kolumny dla podanej daty"""
+        return (day - self.start).days
+    
+    def row(self, user_id: int) -> Optional[np.ndarray]:
+        """Zwraca dzienne obłożenie użytkownika lub None, jeśli brak go w macierzy"""
+        row = self._row_by_user.get(user_id)
+        return self.allocation[row] if row is not None else None
+    
+    def to_dict(self) -> Dict[int, List[float]]:
+        """Serializuje obłożenie jako słownik user_id -> lista wartości dziennych"""
+        return {user_id: row for user_id, row in zip(self.user_ids, self.allocation.tolist())}
+    
+    def runs(self) -> Dict[int, List[List]]:
+        """Koduje obłożenie długościami serii: user_id -> [[od, do, wartość], ...].
+        
+        Serie o zerowym obłożeniu są pomijane, daty podawane są w formacie ISO.
+        Wartości porównywane są po zaokrągleniu do setnych, więc różnice
+        zmiennoprzecinkowe nie dzielą serii ani nie tworzą serii bliskich zera.
+        """
+        if not self.user_ids or not self.days:
+            return {}
+        
+        allocation = np.round(self.allocation, 2)
+        changes = np.ones(allocation.shape, dtype=bool)
+        changes[:, 1:] = allocation[:, 1:] != allocation[:, :-1]
+        rows, starts = np.nonzero(changes)
+        
+        ends = np.full(starts.shape, self.days - 1)
+        same_row = rows[:-1] == rows[1:]
+        ends[:-1][same_row] = starts[1:][same_row] - 1
+        values = allocation[rows, starts]
+        nonzero = values != 0
+        
+        iso_dates = [day.isoformat() for day in self.dates]
+        result: Dict[int, List[List]] = {}
+        for row, first, last, value in zip(rows[nonzero].tolist(), starts[nonzero].tolist(),
+                                           ends[nonzero].tolist(), values[nonzero].tolist()):
+            result.setdefault(self.user_ids[row], []).append([iso_dates[first], iso_dates[last], value])
+        return result
+    
+    def summary(self, overload_threshold: float = 100.0) -> List[Dict]:
+        """Zwraca podsumowanie obłożenia per użytkownik (średnia, maksimum, dni przeciążenia)"""
+        if not self.user_ids or not self.days:
+            return []
+        
+        averages = self.allocation.mean(axis=1)
+        maximums = self.allocation.max(axis=1)
+        overloaded_days = (self.allocation > overload_threshold).sum(axis=1)
+        absent_days = self.absence.sum(axis=1)
+        
+        return [
+            {
+                'user_id': user_id,
+                'average_allocation': round(float(averages[row]), 1),
+                'max_allocation': round(float(maximums[row]), 1),
+                'overloaded_days': int(overloaded_days[row]),
+                'absent_days': int(absent_days[row])
+            }
+            for row, user_id in enumerate(self.user_ids)
+        ]
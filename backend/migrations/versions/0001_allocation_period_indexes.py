@@ -0,0 +1,48 @@
+"""Indeksy złożone i GiST dla zapytań zakresowych alokacji i nieobecności
+
+Revision ID: 0001_allocation_period_indexes
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+Tabele tworzy db.create_all() przy starcie aplikacji (razem z indeksami z
+modeli), więc migracja dodaje indeksy tylko tam, gdzie ich brakuje.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_allocation_period_indexes'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+PERIOD_TABLES = ('resource_allocations', 'absences')
+
+
+def _existing_tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade():
+    tables = _existing_tables()
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    
+    for table in PERIOD_TABLES:
+        if table not in tables:
+            continue
+        op.execute(
+            f"CREATE INDEX IF NOT EXISTS ix_{table}_user_period "
+            f"ON {table} (user_id, start_date, end_date)"
+        )
+        if is_postgresql:
+            op.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_period_gist "
+                f"ON {table} USING gist (daterange(start_date, end_date, '[]'))"
+            )
+
+
+def downgrade():
+    for table in PERIOD_TABLES:
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_period_gist")
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_user_period")
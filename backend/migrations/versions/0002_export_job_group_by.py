@@ -0,0 +1,38 @@
+"""Kolumna group_by w zadaniach eksportu
+
+Revision ID: 0002_export_job_group_by
+Revises: 0001_allocation_period_indexes
+Create Date: 2026-10-18 12:00:00.000000
+
+Nowe bazy dostają kolumnę z db.create_all(), więc migracja dodaje ją
+tylko do istniejącej tabeli, która jej nie ma.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_export_job_group_by'
+down_revision = '0001_allocation_period_indexes'
+branch_labels = None
+depends_on = None
+
+
+def _export_job_columns():
+    inspector = sa.inspect(op.get_bind())
+    if 'export_jobs' not in inspector.get_table_names():
+        return None
+    return {column['name'] for column in inspector.get_columns('export_jobs')}
+
+
+def upgrade():
+    columns = _export_job_columns()
+    if columns is not None and 'group_by' not in columns:
+        op.add_column('export_jobs', sa.Column('group_by', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    columns = _export_job_columns()
+    if columns is not None and 'group_by' in columns:
+        with op.batch_alter_table('export_jobs') as batch_op:
+            batch_op.drop_column('group_by')
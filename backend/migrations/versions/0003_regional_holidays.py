@@ -0,0 +1,47 @@
+"""Święta regionalne (strefa czasowa) w tabeli holidays
+
+Revision ID: 0003_regional_holidays
+Revises: 0002_export_job_group_by
+Create Date: 2026-10-18 14:00:00.000000
+
+Nowe bazy dostają tabelę z db.create_all(). W istniejącej tabeli migracja
+dodaje kolumnę timezone i zastępuje unikalny indeks daty zwykłym - ta sama
+data może być świętem w kilku strefach.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_regional_holidays'
+down_revision = '0002_export_job_group_by'
+branch_labels = None
+depends_on = None
+
+
+def _holiday_schema():
+    inspector = sa.inspect(op.get_bind())
+    if 'holidays' not in inspector.get_table_names():
+        return None, None
+    columns = {column['name'] for column in inspector.get_columns('holidays')}
+    indexes = {index['name']: index for index in inspector.get_indexes('holidays')}
+    return columns, indexes
+
+
+def upgrade():
+    columns, indexes = _holiday_schema()
+    if columns is None:
+        return
+    if 'timezone' not in columns:
+        op.add_column('holidays', sa.Column('timezone', sa.String(length=50), nullable=True))
+    date_index = indexes.get('ix_holidays_date')
+    if date_index is not None and date_index.get('unique'):
+        op.drop_index('ix_holidays_date', table_name='holidays')
+        op.create_index('ix_holidays_date', 'holidays', ['date'], unique=False)
+
+
+def downgrade():
+    columns, _ = _holiday_schema()
+    if columns is not None and 'timezone' in columns:
+        with op.batch_alter_table('holidays') as batch_op:
+            batch_op.drop_column('timezone')
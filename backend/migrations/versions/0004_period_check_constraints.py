@@ -0,0 +1,70 @@
+"""Ograniczenia CHECK: okres alokacji i nieobecności nie kończy się przed początkiem
+
+Revision ID: 0004_period_check_constraints
+Revises: 0003_regional_holidays
+Create Date: 2026-10-19 09:00:00.000000
+
+Nowe bazy dostają ograniczenia z db.create_all(). Jeśli istniejąca tabela
+zawiera okresy z end_date < start_date (mogły powstać przed walidacją w
+API), migracja przerywa się z listą ich identyfikatorów - daty trzeba
+poprawić ręcznie i ponowić flask db upgrade.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_period_check_constraints'
+down_revision = '0003_regional_holidays'
+branch_labels = None
+depends_on = None
+
+PERIOD_CONSTRAINTS = {
+    'resource_allocations': ('ck_resource_allocations_period', 'end_date IS NULL OR end_date >= start_date'),
+    'absences': ('ck_absences_period', 'end_date >= start_date'),
+}
+
+
+def _existing_constraints():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    return {
+        table: {constraint['name'] for constraint in inspector.get_check_constraints(table)}
+        for table in PERIOD_CONSTRAINTS if table in tables
+    }
+
+
+def _inverted_periods(table: str):
+    """Identyfikatory wierszy kończących się przed początkiem"""
+    return [row[0] for row in op.get_bind().execute(
+        sa.text(f"SELECT id FROM {table} WHERE end_date < start_date ORDER BY id")
+    )]
+
+
+def upgrade():
+    missing = {table: PERIOD_CONSTRAINTS[table] for table, names in _existing_constraints().items()
+               if PERIOD_CONSTRAINTS[table][0] not in names}
+    
+    invalid = {}
+    for table in missing:
+        ids = _inverted_periods(table)
+        if ids:
+            invalid[table] = ids
+    if invalid:
+        details = '; '.join(f"{table} id: {ids}" for table, ids in invalid.items())
+        raise RuntimeError(
+            f"Okresy z end_date < start_date blokują dodanie ograniczeń CHECK ({details}). "
+            "Popraw daty tych wierszy i uruchom migrację ponownie."
+        )
+    
+    for table, (name, condition) in missing.items():
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_check_constraint(name, condition)
+
+
+def downgrade():
+    for table, names in _existing_constraints().items():
+        name, _ = PERIOD_CONSTRAINTS[table]
+        if name in names:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.drop_constraint(name, type_='check')
@@ -1,11 +1,43 @@
 """Modele danych"""
+import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Integer, String, cast, func, insert, literal_column, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload
 from datetime import datetime, date
 from typing import Optional
 
 db = SQLAlchemy()
 
 
+def _period_range(start, end):
+    """Wyrażenie daterange(start, end, '[]') - koniec NULL oznacza zakres otwarty.
+    
+    Koniec przed początkiem to błąd PostgreSQL, stąd ograniczenia CHECK okresów w tabelach.
+    """
+    return func.daterange(start, end, literal_column("'[]'"))
+
+
+class PeriodMixin:
+    """Wspólne zapytania zakresowe dla modeli z kolumnami start_date/end_date"""
+    
+    @classmethod
+    def overlaps(cls, start: date, end: Optional[date] = None):
+        """Warunek: okres rekordu nachodzi na [start, end] (end=None - bez końca).
+        
+        Na PostgreSQL używa operatora && na daterange (indeks GiST), na
+        pozostałych bazach porównań korzystających z indeksu (user_id, start_date, end_date).
+        """
+        if db.session.get_bind().dialect.name == 'postgresql':
+            return _period_range(cls.start_date, cls.end_date).op('&&')(_period_range(start, end))
+        
+        condition = (cls.end_date == None) | (cls.end_date >= start)
+        if end is not None:
+            condition = (cls.start_date <= end) & condition
+        return condition
+
+
 class Project(db.Model):
     """Model projektu z Jiry"""
     __tablename__ = 'projects'
@@ -24,6 +56,7 @@ class Project(db.Model):
     
     # Relacje
     allocations = db.relationship('ResourceAllocation', back_populates='project', cascade='all, delete-orphan')
+    members = db.relationship('ProjectMember', back_populates='project', cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -60,6 +93,8 @@ class User(db.Model):
     # Relacje
     allocations = db.relationship('ResourceAllocation', back_populates='user', cascade='all, delete-orphan')
     absences = db.relationship('Absence', back_populates='user', cascade='all, delete-orphan')
+    worklogs = db.relationship('Worklog', back_populates='user')
+    memberships = db.relationship('ProjectMember', back_populates='user', cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -77,9 +112,18 @@ class User(db.Model):
         }
 
 
-class ResourceAllocation(db.Model):
+class ResourceAllocation(PeriodMixin, db.Model):
     """Model alokacji zasobów (przypisanie użytkownika do projektu)"""
     __tablename__ = 'resource_allocations'
+    __table_args__ = (
+        db.CheckConstraint('end_date IS NULL OR end_date >= start_date', name='ck_resource_allocations_period'),
+        db.Index('ix_resource_allocations_user_period', 'user_id', 'start_date', 'end_date'),
+        db.Index(
+            'ix_resource_allocations_period_gist',
+            _period_range(literal_column('start_date'), literal_column('end_date')),
+            postgresql_using='gist'
+        ).ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -96,13 +140,17 @@ class ResourceAllocation(db.Model):
     user = db.relationship('User', back_populates='allocations')
     project = db.relationship('Project', back_populates='allocations')
     
-    def to_dict(self):
-        return {
+    @classmethod
+    def query_with_relations(cls):
+        """Zapytanie dociągające użytkownika i projekt w tym samym SELECT (bez N+1)"""
+        return cls.query.options(joinedload(cls.user), joinedload(cls.project))
+    
+    def to_dict(self, compact: bool = False):
+        """Serializuje alokację; compact=True pomija zagnieżdżone obiekty (tylko user_id/project_id)"""
+        data = {
             'id': self.id,
             'user_id': self.user_id,
-            'user': self.user.to_dict() if self.user else None,
             'project_id': self.project_id,
-            'project': self.project.to_dict() if self.project else None,
             'role': self.role,
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
@@ -111,11 +159,24 @@ class ResourceAllocation(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if not compact:
+            data['user'] = self.user.to_dict() if self.user else None
+            data['project'] = self.project.to_dict() if self.project else None
+        return data
 
 
-class Absence(db.Model):
+class Absence(PeriodMixin, db.Model):
     """Model nieobecności (urlopy, dni wolne)"""
     __tablename__ = 'absences'
+    __table_args__ = (
+        db.CheckConstraint('end_date >= start_date', name='ck_absences_period'),
+        db.Index('ix_absences_user_period', 'user_id', 'start_date', 'end_date'),
+        db.Index(
+            'ix_absences_period_gist',
+            _period_range(literal_column('start_date'), literal_column('end_date')),
+            postgresql_using='gist'
+        ).ddl_if(dialect='postgresql'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -130,11 +191,16 @@ class Absence(db.Model):
     # Relacje
     user = db.relationship('User', back_populates='absences')
     
-    def to_dict(self):
-        return {
+    @classmethod
+    def query_with_relations(cls):
+        """Zapytanie dociągające użytkownika w tym samym SELECT (bez N+1)"""
+        return cls.query.options(joinedload(cls.user))
+    
+    def to_dict(self, compact: bool = False):
+        """Serializuje nieobecność; compact=True pomija zagnieżdżony obiekt użytkownika"""
+        data = {
             'id': self.id,
             'user_id': self.user_id,
-            'user': self.user.to_dict() if self.user else None,
             'absence_type': self.absence_type,
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
@@ -143,6 +209,116 @@ class Absence(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if not compact:
+            data['user'] = self.user.to_dict() if self.user else None
+        return data
+
+
+class Holiday(db.Model):
+    """Dzień wolny od pracy (święto) dla całego zespołu lub jednej strefy czasowej"""
+    __tablename__ = 'holidays'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    name = db.Column(db.String(200))
+    timezone = db.Column(db.String(50))  # None = wszyscy, inaczej tylko użytkownicy z tej strefy
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'date': self.date.isoformat() if self.date else None,
+            'name': self.name,
+            'timezone': self.timezone,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class DailyCapacity(db.Model):
+    """Zmaterializowane dzienne obłożenie użytkownika (utrzymywane przyrostowo).
+    
+    Przechowywane są tylko dni z alokacją lub nieobecnością - brak wiersza
+    oznacza dzień w pełni dostępny.
+    """
+    __tablename__ = 'daily_capacity'
+    __table_args__ = (
+        db.Index('ix_daily_capacity_date', 'date'),
+    )
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    allocated_pct = db.Column(db.Float, nullable=False, default=0.0)
+    absent = db.Column(db.Boolean, nullable=False, default=False)
+    available_hours = db.Column(db.Float, nullable=False, default=0.0)
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'date': self.date.isoformat() if self.date else None,
+            'allocated_pct': self.allocated_pct,
+            'absent': self.absent,
+            'available_hours': self.available_hours
+        }
+
+
+class ExportJob(db.Model):
+    """Model zadania eksportu raportu renderowanego w tle"""
+    __tablename__ = 'export_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # Format, zakres dat i generacja danych - identyczne zlecenia współdzielą wynik
+    params_key = db.Column(db.String(255), nullable=False, index=True)
+    export_format = db.Column(db.String(20), nullable=False)  # excel, pdf
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    group_by = db.Column(db.String(20))  # user, project (tylko PDF)
+    status = db.Column(db.String(50), nullable=False, default='pending')  # pending, running, done, error
+    file_path = db.Column(db.String(500))
+    error_message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'format': self.export_format,
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'group_by': self.group_by,
+            'status': self.status,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class SyncJob(db.Model):
+    """Model zadania synchronizacji w kolejce wykonywanej przez worker"""
+    __tablename__ = 'sync_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)  # all, projects, users, project_members, worklogs
+    status = db.Column(db.String(50), nullable=False, default='pending', index=True)  # pending, running, done, partial, error
+    worker = db.Column(db.String(255))
+    result = db.Column(db.Text)  # JSON z wynikiem SyncService
+    error_message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'result': json.loads(self.result) if self.result else None,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
 
 
 class SyncLog(db.Model):
@@ -151,7 +327,7 @@ class SyncLog(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     sync_type = db.Column(db.String(50), nullable=False)  # jira_projects, jira_users, tempo_worklogs
-    status = db.Column(db.String(50), nullable=False)  # success, error, partial
+    status = db.Column(db.String(50), nullable=False)  # running, success, error, partial, skipped
     records_processed = db.Column(db.Integer, default=0)
     records_created = db.Column(db.Integer, default=0)
     records_updated = db.Column(db.Integer, default=0)
@@ -171,3 +347,134 @@ class SyncLog(db.Model):
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
+
+
+class ProjectMember(db.Model):
+    """Model członkostwa użytkownika w projekcie (rola 'Users' z Jiry)"""
+    __tablename__ = 'project_members'
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'user_id', name='uq_project_members_project_user'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    last_synced = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relacje
+    project = db.relationship('Project', back_populates='members')
+    user = db.relationship('User', back_populates='memberships')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'user_id': self.user_id,
+            'last_synced': self.last_synced.isoformat() if self.last_synced else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class Worklog(db.Model):
+    """Model worklogu z Tempo (zarejestrowany czas pracy)"""
+    __tablename__ = 'worklogs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tempo_worklog_id = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    jira_account_id = db.Column(db.String(255), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)  # None = autor spoza bazy
+    issue_id = db.Column(db.String(50))
+    issue_key = db.Column(db.String(50), index=True)
+    start_date = db.Column(db.Date, nullable=False, index=True)
+    time_spent_seconds = db.Column(db.Integer, default=0)
+    billable_seconds = db.Column(db.Integer)
+    description = db.Column(db.Text)
+    tempo_updated_at = db.Column(db.DateTime)
+    last_synced = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relacje
+    user = db.relationship('User', back_populates='worklogs')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tempo_worklog_id': self.tempo_worklog_id,
+            'jira_account_id': self.jira_account_id,
+            'user_id': self.user_id,
+            'issue_id': self.issue_id,
+            'issue_key': self.issue_key,
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'time_spent_seconds': self.time_spent_seconds,
+            'hours': round((self.time_spent_seconds or 0) / 3600, 2),
+            'billable_seconds': self.billable_seconds,
+            'description': self.description,
+            'tempo_updated_at': self.tempo_updated_at.isoformat() if self.tempo_updated_at else None,
+            'last_synced': self.last_synced.isoformat() if self.last_synced else None
+        }
+
+
+class SyncState(db.Model):
+    """Model stanu synchronizacji (np. znacznik ostatniej synchronizacji przyrostowej)"""
+    __tablename__ = 'sync_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), unique=True, nullable=False, index=True)
+    value = db.Column(db.String(255))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def get_value(cls, key: str) -> Optional[str]:
+        """Zwraca wartość stanu lub None"""
+        state = cls.query.filter_by(key=key).first()
+        return state.value if state else None
+    
+    @classmethod
+    def set_value(cls, key: str, value: str):
+        """Ustawia wartość stanu (bez commita)"""
+        state = cls.query.filter_by(key=key).first()
+        if state is None:
+            state = cls(key=key)
+            db.session.add(state)
+        state.value = value
+        state.updated_at = datetime.utcnow()
+    
+    @classmethod
+    def increment(cls, key: str):
+        """Atomowo zwiększa liczbową wartość stanu o 1 (bez commita).
+        
+        Dodawanie wykonuje baza w UPDATE, więc równoległe transakcje nie
+        nadpisują sobie wyniku. Brakujący wiersz wstawiany jest przez
+        INSERT ... ON CONFLICT DO NOTHING - gdy wstawił go już inny proces,
+        wartość jest po prostu zwiększana.
+        """
+        table = cls.__table__
+        now = datetime.utcnow()
+        bump = update(table).where(table.c.key == key).values(
+            value=cast(func.coalesce(cast(table.c.value, Integer), 0) + 1, String(255)),
+            updated_at=now
+        )
+        if db.session.execute(bump).rowcount:
+            return
+        
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            dialect_insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+            stmt = dialect_insert(table).values(key=key, value='1', updated_at=now)
+            stmt = stmt.on_conflict_do_nothing(index_elements=['key'])
+        else:
+            stmt = insert(table).values(key=key, value='1', updated_at=now)
+        if not db.session.execute(stmt).rowcount:
+            db.session.execute(bump)
+
+
+class JobLease(db.Model):
+    """Dzierżawa zadania cyklicznego - tylko właściciel ważnej dzierżawy wykonuje zadanie"""
+    __tablename__ = 'job_leases'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(255))
+    expires_at = db.Column(db.DateTime, nullable=False)
+    acquired_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,140 @@
+"""Cache odpowiedzi endpointów kalendarza, analityki i eksportu"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Optional, Tuple
+
+from flask import Response, make_response, request
+
+from .config import Config
+from .models import db, SyncState
+from . import working_calendar
+
+# Klucz SyncState z numerem generacji danych - zmiana numeru unieważnia cały cache
+GENERATION_KEY = 'response_cache_generation'
+
+CachedResponse = Tuple[bytes, int, list]
+
+
+class LRUBackend:
+    """Cache w pamięci procesu z wypieraniem najdawniej używanych wpisów"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: CachedResponse, ttl: int):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Cache współdzielony przez wszystkie procesy (wymaga pakietu redis)"""
+    
+    def __init__(self, url: str, prefix: str = 'capacity:response:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+    
+    def get(self, key: str) -> Optional[CachedResponse]:
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+    
+    def set(self, key: str, value: CachedResponse, ttl: int):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+    
+    def clear(self):
+        # Wpisy starych generacji wygasają same (TTL)
+        pass
+
+
+class ResponseCache:
+    """Cache odpowiedzi kluczowany endpointem, parametrami i generacją danych.
+    
+    Numer generacji przechowywany jest w bazie (SyncState), więc zapis w
+    dowolnym procesie - workerze gunicorna czy synchronizacji - unieważnia
+    wpisy wszystkich procesów.
+    """
+    
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+    
+    def generation(self) -> str:
+        """Zwraca bieżący numer generacji danych"""
+        value = db.session.query(SyncState.value).filter_by(key=GENERATION_KEY).scalar()
+        return value or '0'
+    
+    def make_key(self, endpoint: str) -> str:
+        """Buduje klucz z generacji, endpointu i parametrów żądania"""
+        args = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        # Dzisiejsza data (w strefie żądania) wchodzi do klucza, bo domyślne zakresy dat od niej zależą
+        today = working_calendar.today(request.args.get('timezone'))
+        return f"{self.generation()}:{endpoint}:{today.isoformat()}:{args}"
+    
+    def invalidate(self):
+        """Unieważnia cache - nowa generacja zapisywana jest razem z bieżącą transakcją"""
+        SyncState.increment(GENERATION_KEY)
+        self.backend.clear()
+    
+    def cached(self, endpoint: str):
+        """Dekorator cache'ujący udane odpowiedzi widoku"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                try:
+                    key = self.make_key(endpoint)
+                    hit = self.backend.get(key)
+                except Exception as e:
+                    print(f"Błąd cache odpowiedzi: {e}")
+                    return view(*args, **kwargs)
+                
+                if hit is not None:
+                    body, status, headers = hit
+                    return Response(body, status=status, headers=headers)
+                
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    headers = [(k, v) for k, v in response.headers if k.lower() != 'content-length']
+                    try:
+                        self.backend.set(key, (response.get_data(), response.status_code, headers), self.ttl)
+                    except Exception as e:
+                        print(f"Błąd zapisu do cache odpowiedzi: {e}")
+                return response
+            return wrapper
+        return decorator
+
+
+def _create_backend():
+    """Tworzy backend cache zgodnie z konfiguracją (redis wymaga REDIS_URL)"""
+    if Config.CACHE_BACKEND == 'redis' and Config.REDIS_URL:
+        try:
+            return RedisBackend(Config.REDIS_URL)
+        except ImportError:
+            print("⚠ Pakiet redis nie jest zainstalowany - używam cache w pamięci")
+    return LRUBackend(Config.CACHE_MAX_ENTRIES)
+
+
+response_cache = ResponseCache(_create_backend(), Config.CACHE_TTL_SECONDS)
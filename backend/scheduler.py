@@ -1,42 +1,70 @@
 """Automatyczne zadania synchronizacji"""
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from datetime import datetime
-from .app import app
+from datetime import datetime, timedelta
 from .config import Config
-from .sync_service import SyncService
-from .jira_client import JiraClient
-from .tempo_client import TempoClient
+from .job_lock import job_lock
+from .models import db, SyncState
+from . import sync_jobs
 
+SYNC_JOB_ID = 'sync_jira_tempo'
+# Blokada samego zlecania (inna niż blokada wykonywania synchronizacji w workerze)
+SCHEDULE_LOCK_NAME = 'sync_schedule'
+# Klucz SyncState z czasem ostatniego automatycznego zlecenia (UTC, ISO)
+LAST_SCHEDULED_KEY = 'sync_schedule_last_enqueued'
+# Część interwału, po której zlecenie uznawane jest za należne - procesy mają
+# przesunięte cykle, a zapis znacznika trwa chwilę po starcie cyklu
+SCHEDULE_SLACK = 0.9
 
-def init_scheduler():
-    """Inicjalizuje scheduler do automatycznych synchronizacji"""
+
+def _due(now: datetime) -> bool:
+    """Czy od ostatniego automatycznego zlecenia (w dowolnym procesie) minął interwał"""
+    value = SyncState.get_value(LAST_SCHEDULED_KEY)
+    if not value:
+        return True
+    interval = timedelta(minutes=Config.SYNC_INTERVAL_MINUTES) * SCHEDULE_SLACK
+    return now - datetime.fromisoformat(value) >= interval
+
+
+def init_scheduler(app):
+    """Inicjalizuje scheduler do automatycznych synchronizacji.
+    
+    Scheduler jedynie zleca synchronizację do kolejki sync_jobs - wykonuje ją
+    worker (python -m backend.worker). Scheduler startuje w każdym procesie
+    (np. w każdym workerze gunicorna), ale zlecenie składa tylko proces, który
+    przejmie blokadę zadania i zastanie znacznik ostatniego zlecenia starszy
+    niż interwał; pozostałe pomijają uruchomienie bez czekania.
+    """
     scheduler = BackgroundScheduler()
     
     def sync_job():
         """Zadanie synchronizacji"""
         with app.app_context():
-            if Config.JIRA_URL and Config.JIRA_EMAIL and Config.JIRA_API_TOKEN:
-                jira_client = JiraClient(Config.JIRA_URL, Config.JIRA_EMAIL, Config.JIRA_API_TOKEN)
-                tempo_client = None
-                if Config.TEMPO_API_TOKEN:
-                    tempo_client = TempoClient(Config.JIRA_URL, Config.TEMPO_API_TOKEN)
-                
-                sync_service = SyncService(jira_client, tempo_client)
-                print(f"[{datetime.now()}] Rozpoczynam automatyczną synchronizację...")
-                sync_service.sync_all()
-                print(f"[{datetime.now()}] Synchronizacja zakończona")
+            if not (Config.JIRA_URL and Config.JIRA_EMAIL and Config.JIRA_API_TOKEN):
+                return
+            with job_lock(SCHEDULE_LOCK_NAME) as acquired:
+                if not acquired:
+                    return
+                now = datetime.utcnow()
+                if not _due(now):
+                    return
+                job = sync_jobs.enqueue('all')
+                SyncState.set_value(LAST_SCHEDULED_KEY, now.isoformat())
+                db.session.commit()
+                print(f"[{datetime.now()}] Zlecono automatyczną synchronizację (zadanie {job.id})")
     
-    # Dodaj zadanie synchronizacji
+    # Dodaj zadanie synchronizacji; przebieg dłuższy niż interwał nie nakłada się
+    # z kolejnym (max_instances), a zaległe uruchomienia łączone są w jedno (coalesce)
     scheduler.add_job(
         sync_job,
         trigger=IntervalTrigger(minutes=Config.SYNC_INTERVAL_MINUTES),
-        id='sync_jira_tempo',
+        id=SYNC_JOB_ID,
         name='Synchronizacja Jira i Tempo',
-        replace_existing=True
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
     )
     
     scheduler.start()
     print(f"✓ Scheduler uruchomiony - synchronizacja co {Config.SYNC_INTERVAL_MINUTES} minut")
     return scheduler
-
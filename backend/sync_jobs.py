@@ -0,0 +1,147 @@
+"""Kolejka zadań synchronizacji w bazie - zlecana przez API i scheduler, wykonywana przez worker"""
+import json
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import update
+
+from .config import Config
+from .models import db, SyncJob
+from .sync_service import FAILED_STAGE_STATUSES
+
+# Typ zadania -> metoda SyncService
+JOB_TYPES = {
+    'all': 'sync_all',
+    'projects': 'sync_projects',
+    'users': 'sync_users',
+    'project_members': 'sync_project_members',
+    'worklogs': 'sync_worklogs',
+}
+
+# Zadania w tych stanach nie zostały jeszcze zakończone
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+def enqueue(job_type: str) -> SyncJob:
+    """Zleca synchronizację lub zwraca niezakończone zadanie tego samego typu"""
+    existing = SyncJob.query.filter(
+        SyncJob.job_type == job_type,
+        SyncJob.status.in_(ACTIVE_STATUSES)
+    ).order_by(SyncJob.id).first()
+    if existing is not None:
+        return existing
+    
+    job = SyncJob(job_type=job_type, status='pending')
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def claim_next(worker_id: str) -> Optional[SyncJob]:
+    """Przejmuje najstarsze oczekujące zadanie (kilka workerów nie dostanie tego samego).
+    
+    W PostgreSQL wiersz blokowany jest przez FOR UPDATE SKIP LOCKED, w innych
+    bazach przejęcie to warunkowy UPDATE pending -> running.
+    """
+    now = datetime.utcnow()
+    query = SyncJob.query.filter_by(status='pending').order_by(SyncJob.id)
+    
+    if db.engine.dialect.name == 'postgresql':
+        job = query.with_for_update(skip_locked=True).first()
+        if job is None:
+            db.session.rollback()
+            return None
+        job.status = 'running'
+        job.worker = worker_id
+        job.started_at = now
+        db.session.commit()
+        return job
+    
+    while True:
+        job_id = query.with_entities(SyncJob.id).limit(1).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+        claimed = db.session.execute(
+            update(SyncJob)
+            .where(SyncJob.id == job_id, SyncJob.status == 'pending')
+            .values(status='running', worker=worker_id, started_at=now)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(SyncJob, job_id, populate_existing=True)
+
+
+def _fail_running(message: str, *conditions) -> int:
+    failed = db.session.execute(
+        update(SyncJob)
+        .where(SyncJob.status == 'running', *conditions)
+        .values(status='error', error_message=message, finished_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return failed
+
+
+def fail_abandoned():
+    """Oznacza jako błędne zadania wykonywane dłużej niż SYNC_JOB_TIMEOUT"""
+    threshold = datetime.utcnow() - timedelta(seconds=Config.SYNC_JOB_TIMEOUT)
+    abandoned = _fail_running('Zadanie przerwane (przekroczony czas wykonania)', SyncJob.started_at < threshold)
+    if abandoned:
+        print(f"⚠ Oznaczono {abandoned} porzuconych zadań synchronizacji")
+
+
+def fail_interrupted():
+    """Oznacza jako błędne wszystkie zadania w stanie running.
+    
+    Wywoływane tylko z blokadą synchronizacji - nikt inny nie może wtedy
+    wykonywać zadania, więc running oznacza worker zabity w trakcie pracy
+    (SIGKILL, OOM, restart). Bez tego zadanie blokowałoby enqueue na zawsze.
+    """
+    interrupted = _fail_running('Zadanie przerwane razem z workerem')
+    if interrupted:
+        print(f"⚠ Oznaczono {interrupted} zadań przerwanych razem z workerem")
+
+
+def job_status(job_type: str, result) -> str:
+    """Status zadania na podstawie wyniku SyncService.
+    
+    Pełna synchronizacja zwraca wyniki etapów - zadanie jest błędne, gdy
+    żaden etap się nie powiódł, i częściowe, gdy nie powiodła się część.
+    """
+    if not isinstance(result, dict):
+        return 'done'
+    if job_type != 'all':
+        return 'error' if result.get('status') == 'error' else 'done'
+    
+    failed = [name for name, stage in result.items()
+              if isinstance(stage, dict) and stage.get('status') in FAILED_STAGE_STATUSES]
+    if not failed:
+        return 'done'
+    return 'error' if len(failed) == len(result) else 'partial'
+
+
+def run_job(sync_service, job: SyncJob):
+    """Wykonuje zadanie i zapisuje wynik (postęp widać w logach SyncLog)"""
+    job_id = job.id
+    try:
+        if sync_service is None:
+            raise RuntimeError('Jira nie jest skonfigurowane')
+        if job.job_type == 'worklogs' and sync_service.tempo_client is None:
+            raise RuntimeError('Tempo nie jest skonfigurowane')
+        
+        result = getattr(sync_service, JOB_TYPES[job.job_type])()
+        job = db.session.get(SyncJob, job_id)
+        job.result = json.dumps(result, default=str)
+        job.status = job_status(job.job_type, result)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        print(f"✓ Synchronizacja {job.job_type} (zadanie {job_id}) zakończona: {job.status}")
+    
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(SyncJob, job_id)
+        job.status = 'error'
+        job.error_message = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        print(f"Błąd podczas synchronizacji (zadanie {job_id}): {e}")
@@ -1,9 +1,179 @@
 """Serwis synchronizacji danych z Jira i Tempo"""
-from datetime import datetime
-from typing import Dict, List
-from .models import db, Project, User, SyncLog
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, date, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from .config import Config
+from .models import db, Project, User, ProjectMember, SyncLog, Worklog, SyncState
 from .jira_client import JiraClient
 from .tempo_client import TempoClient
+from .response_cache import response_cache
+from . import working_calendar
+
+
+# Mapowanie kolumn modelu na ścieżki w odpowiedzi Jiry
+PROJECT_FIELDS = {
+    'name': ('name',),
+    'description': ('description',),
+    'project_type': ('projectTypeKey',),
+    'lead_email': ('lead', 'emailAddress'),
+    'avatar_url': ('avatarUrls', '48x48'),
+}
+PROJECT_DEFAULTS = {
+    'name': '',
+    'description': '',
+    'project_type': None,
+    'lead_email': None,
+    'avatar_url': None,
+    'is_active': True,
+}
+
+USER_FIELDS = {
+    'email': ('emailAddress',),
+    'display_name': ('displayName',),
+    'avatar_url': ('avatarUrls', '48x48'),
+}
+USER_DEFAULTS = {
+    'email': '',
+    'display_name': '',
+    'avatar_url': None,
+    'is_active': True,
+}
+
+# Wyniki etapu, po których etapy od niego zależne są pomijane
+FAILED_STAGE_STATUSES = ('error', 'skipped')
+
+# Ile stron worklogów może czekać na zapis, gdy pobieranie wyprzedza bazę
+SYNC_PREFETCH_PAGES = 4
+
+WORKLOG_DEFAULTS = {
+    'jira_account_id': None,
+    'user_id': None,
+    'issue_id': None,
+    'issue_key': None,
+    'start_date': None,
+    'time_spent_seconds': 0,
+    'billable_seconds': None,
+    'description': None,
+    'tempo_updated_at': None,
+}
+
+
+def _parse_tempo_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Zamienia znacznik czasu z Tempo (ISO 8601) na naiwny datetime w UTC"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _worklog_values(worklog: Dict, users_by_account: Dict[str, int]) -> Dict:
+    """Mapuje worklog z Tempo na kolumny modelu Worklog"""
+    author = worklog.get('author') or {}
+    issue = worklog.get('issue') or {}
+    account_id = author.get('accountId')
+    start_date = worklog.get('startDate')
+    
+    return {
+        'jira_account_id': account_id,
+        'user_id': users_by_account.get(account_id),
+        'issue_id': str(issue['id']) if issue.get('id') is not None else None,
+        'issue_key': issue.get('key'),
+        'start_date': date.fromisoformat(start_date[:10]) if start_date else None,
+        'time_spent_seconds': worklog.get('timeSpentSeconds', 0),
+        'billable_seconds': worklog.get('billableSeconds'),
+        'description': worklog.get('description'),
+        'tempo_updated_at': _parse_tempo_datetime(worklog.get('updatedAt')),
+    }
+
+
+def _extract_fields(payload: Dict, mapping: Dict[str, Tuple[str, ...]]) -> Dict:
+    """Wyciąga z odpowiedzi Jiry tylko te pola, które w niej występują"""
+    values = {}
+    for field, path in mapping.items():
+        current = payload
+        for part in path:
+            if not isinstance(current, dict) or part not in current:
+                break
+            current = current[part]
+        else:
+            values[field] = current
+    return values
+
+
+def _batches(items: List, size: int) -> Iterable[List]:
+    """Dzieli listę na paczki o podanym rozmiarze"""
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+class SyncStage:
+    """Etap synchronizacji.
+    
+    prepare (odczyty z bazy) i apply (zapis) wykonywane są w wątku
+    wywołującym, fetch (tylko żądania do API) może biec w osobnym wątku.
+    depends_on to etapy, które muszą być zapisane przed apply, a przy
+    fetch_after_dependencies także przed prepare/fetch. Etap streaming
+    zwraca z fetch iterator stron zapisywanych w trakcie pobierania.
+    """
+    
+    def __init__(self, name: str, sync_type: str, fetch: Callable, apply: Callable,
+                 depends_on: Sequence[str] = (), prepare: Optional[Callable] = None,
+                 fetch_after_dependencies: bool = False, streaming: bool = False):
+        self.name = name
+        self.sync_type = sync_type
+        self.fetch = fetch
+        self.apply = apply
+        self.depends_on = tuple(depends_on)
+        self.prepare = prepare
+        self.fetch_after_dependencies = fetch_after_dependencies
+        self.streaming = streaming
+
+
+class _PrefetchedPages:
+    """Strony pobierane w osobnym wątku do ograniczonej kolejki i czytane przy zapisie"""
+    
+    _DONE = object()
+    
+    def __init__(self, max_pages: int = SYNC_PREFETCH_PAGES):
+        self._queue = queue.Queue(maxsize=max_pages)
+        self._cancelled = threading.Event()
+    
+    def fill(self, fetch: Callable, context):
+        """Pobiera strony (w wątku puli) aż do końca, błędu lub anulowania"""
+        try:
+            for page in fetch(context):
+                if not self._put(page):
+                    return
+            self._put(self._DONE)
+        except Exception as e:
+            self._put(e)
+    
+    def _put(self, item) -> bool:
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def cancel(self):
+        """Przerywa pobieranie (np. po błędzie zapisu)"""
+        self._cancelled.set()
+    
+    def __iter__(self) -> Iterator[List[Dict]]:
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
 
 
 class SyncService:
@@ -12,136 +182,427 @@ class SyncService:
     def __init__(self, jira_client: JiraClient, tempo_client: TempoClient = None):
         self.jira_client = jira_client
         self.tempo_client = tempo_client
+        self.batch_size = Config.SYNC_BATCH_SIZE
     
-    def sync_projects(self) -> Dict:
-        """Synchronizuje projekty z Jiry"""
+    def _bulk_reconcile(self, model, key_name: str, incoming: Dict[str, Dict],
+                        defaults: Dict, scoped: bool = False) -> Tuple[int, int]:
+        """Uzgadnia rekordy z Jiry z bazą hurtowo.
+        
+        Istniejące wiersze są ładowane jednym zapytaniem i porównywane w pamięci.
+        Nowe i zmienione rekordy zapisywane są paczkami (na PostgreSQL przez
+        INSERT ... ON CONFLICT DO UPDATE), a niezmienione wiersze nie są
+        zapisywane wcale. Zwraca krotkę (utworzone, zaktualizowane).
+        
+        Przy scoped=True ładowane są tylko wiersze o kluczach z incoming
+        (dla dużych tabel uzgadnianych stronami, np. worklogów).
+        """
+        now = datetime.utcnow()
+        fields = list(defaults)
+        key_column = getattr(model, key_name)
+        columns = [key_column, model.id, *[getattr(model, f) for f in fields]]
+        
+        if scoped:
+            existing = {}
+            for batch in _batches(list(incoming), self.batch_size):
+                existing.update(
+                    (row[0], row) for row in db.session.query(*columns).filter(key_column.in_(batch))
+                )
+        else:
+            existing = {row[0]: row for row in db.session.query(*columns)}
+        
+        inserts = []
+        updates = []
+        
+        for key, values in incoming.items():
+            row = existing.get(key)
+            if row is None:
+                inserts.append({key_name: key, **defaults, **values,
+                                'last_synced': now, 'created_at': now, 'updated_at': now})
+                continue
+            
+            current = dict(zip(fields, row[2:]))
+            merged = {**current, **values}
+            if merged != current:
+                updates.append({'id': row[1], key_name: key, **merged,
+                                'last_synced': now, 'updated_at': now})
+        
+        if db.engine.dialect.name == 'postgresql':
+            self._upsert_postgresql(model, key_name, fields, inserts, updates, now)
+        else:
+            for batch in _batches(inserts, self.batch_size):
+                db.session.bulk_insert_mappings(model, batch)
+            for batch in _batches(updates, self.batch_size):
+                db.session.bulk_update_mappings(model, batch)
+        
+        return len(inserts), len(updates)
+    
+    def _upsert_postgresql(self, model, key_name: str, fields: List[str],
+                           inserts: List[Dict], updates: List[Dict], now: datetime):
+        """Zapisuje nowe i zmienione rekordy przez INSERT ... ON CONFLICT DO UPDATE"""
+        rows = inserts + [
+            {**{k: v for k, v in row.items() if k != 'id'}, 'created_at': now}
+            for row in updates
+        ]
+        
+        for batch in _batches(rows, self.batch_size):
+            stmt = pg_insert(model.__table__).values(batch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[key_name],
+                set_={column: stmt.excluded[column] for column in fields + ['last_synced', 'updated_at']}
+            )
+            db.session.execute(stmt)
+    
+    # ========== Etapy synchronizacji ==========
+    #
+    # Każdy etap składa się z przygotowania (odczyty z bazy), pobrania z API
+    # (bez dostępu do bazy - może działać w osobnym wątku) i zapisu do bazy.
+    
+    def _stages(self) -> List[SyncStage]:
+        """Etapy pełnej synchronizacji w kolejności zapisu"""
+        stages = [
+            SyncStage('projects', 'jira_projects', self._fetch_projects, self._apply_projects),
+            SyncStage('users', 'jira_users', self._fetch_users, self._apply_users),
+        ]
+        if Config.SYNC_PROJECT_MEMBERS:
+            # Lista projektów do pobrania pochodzi z bazy, więc pobranie też czeka na zależności
+            stages.append(SyncStage('project_members', 'jira_project_members',
+                                    self._fetch_project_members, self._apply_project_members,
+                                    depends_on=('projects', 'users'), prepare=self._prepare_project_members,
+                                    fetch_after_dependencies=True))
+        if self.tempo_client:
+            # Strony worklogów pobierane są od razu, zapis czeka na użytkowników
+            stages.append(SyncStage('worklogs', 'tempo_worklogs', self._fetch_worklogs, self._apply_worklogs,
+                                    depends_on=('users',), prepare=self._prepare_worklogs, streaming=True))
+        return stages
+    
+    @staticmethod
+    def _start_log(sync_type: str) -> SyncLog:
+        """Zapisuje log etapu ze statusem running (widoczny od razu dla UI)"""
         log = SyncLog(
-            sync_type='jira_projects',
+            sync_type=sync_type,
             status='running',
             started_at=datetime.utcnow()
         )
         db.session.add(log)
-        db.session.flush()
-        
+        db.session.commit()
+        return log
+    
+    @staticmethod
+    def _fail_log(log: SyncLog, error: Exception) -> Dict:
+        """Wycofuje zmiany etapu i zapisuje błąd w jego logu"""
+        db.session.rollback()
+        db.session.add(log)
+        log.status = 'error'
+        log.error_message = str(error)
+        log.completed_at = datetime.utcnow()
+        db.session.commit()
+        return {'status': 'error', 'error': str(error)}
+    
+    @staticmethod
+    def _skip_log(log: SyncLog, reason: str) -> Dict:
+        """Zapisuje w logu etapu, że etap został pominięty"""
+        db.session.add(log)
+        log.status = 'skipped'
+        log.error_message = reason
+        log.completed_at = datetime.utcnow()
+        db.session.commit()
+        return {'status': 'skipped', 'reason': reason}
+    
+    def _run_stage(self, stage: SyncStage) -> Dict:
+        """Wykonuje pojedynczy etap sekwencyjnie"""
+        log = self._start_log(stage.sync_type)
         try:
-            jira_projects = self.jira_client.get_projects()
-            created = 0
-            updated = 0
-            
-            for jira_project in jira_projects:
-                project_key = jira_project.get('key')
-                if not project_key:
+            context = stage.prepare() if stage.prepare else None
+            return stage.apply(log, context, stage.fetch(context))
+        except Exception as e:
+            return self._fail_log(log, e)
+    
+    def _fetch_projects(self, context) -> List[Dict]:
+        return self.jira_client.get_projects()
+    
+    def _apply_projects(self, log: SyncLog, context, jira_projects: List[Dict]) -> Dict:
+        changed_projects, hashes = self.jira_client.filter_changed('project', jira_projects, 'key')
+        
+        incoming = {}
+        for jira_project in changed_projects:
+            project_key = jira_project.get('key')
+            if not project_key:
+                continue
+            incoming[project_key] = {**_extract_fields(jira_project, PROJECT_FIELDS), 'is_active': True}
+        
+        created, updated = self._bulk_reconcile(Project, 'jira_key', incoming, PROJECT_DEFAULTS,
+                                                scoped=len(incoming) <= self.batch_size)
+        if created or updated:
+            response_cache.invalidate()
+        
+        log.status = 'success'
+        log.records_processed = len(jira_projects)
+        log.records_created = created
+        log.records_updated = updated
+        log.completed_at = datetime.utcnow()
+        
+        db.session.commit()
+        self.jira_client.remember_hashes(hashes)
+        return {'status': 'success', 'created': created, 'updated': updated, 'total': len(jira_projects)}
+    
+    def _fetch_users(self, context) -> List[Dict]:
+        return self.jira_client.get_all_users()
+    
+    def _apply_users(self, log: SyncLog, context, jira_users: List[Dict]) -> Dict:
+        changed_users, hashes = self.jira_client.filter_changed('user', jira_users, 'accountId')
+        
+        incoming = {}
+        for jira_user in changed_users:
+            account_id = jira_user.get('accountId')
+            if not account_id:
+                continue
+            incoming[account_id] = {
+                **_extract_fields(jira_user, USER_FIELDS),
+                'is_active': jira_user.get('active', True)
+            }
+        
+        created, updated = self._bulk_reconcile(User, 'jira_account_id', incoming, USER_DEFAULTS,
+                                                scoped=len(incoming) <= self.batch_size)
+        if created or updated:
+            response_cache.invalidate()
+        
+        log.status = 'success'
+        log.records_processed = len(jira_users)
+        log.records_created = created
+        log.records_updated = updated
+        log.completed_at = datetime.utcnow()
+        
+        db.session.commit()
+        self.jira_client.remember_hashes(hashes)
+        return {'status': 'success', 'created': created, 'updated': updated, 'total': len(jira_users)}
+    
+    def _prepare_project_members(self) -> Dict:
+        return {
+            'projects_by_key': dict(
+                db.session.query(Project.jira_key, Project.id).filter(Project.is_active == True)
+            ),
+            'users_by_account': dict(db.session.query(User.jira_account_id, User.id))
+        }
+    
+    def _fetch_project_members(self, context: Dict) -> Dict[str, List[Dict]]:
+        return self.jira_client.get_users_for_projects(list(context['projects_by_key']))
+    
+    def _apply_project_members(self, log: SyncLog, context: Dict,
+                               actors_by_project: Dict[str, List[Dict]]) -> Dict:
+        projects_by_key = context['projects_by_key']
+        users_by_account = context['users_by_account']
+        
+        desired = set()
+        for project_key, actors in actors_by_project.items():
+            project_id = projects_by_key[project_key]
+            for actor in actors:
+                account_id = (actor.get('actorUser') or {}).get('accountId')
+                user_id = users_by_account.get(account_id)
+                if user_id:
+                    desired.add((project_id, user_id))
+        
+        synced_project_ids = [projects_by_key[key] for key in actors_by_project]
+        existing = {}
+        for batch in _batches(synced_project_ids, self.batch_size):
+            existing.update(
+                ((project_id, user_id), member_id)
+                for member_id, project_id, user_id in db.session.query(
+                    ProjectMember.id, ProjectMember.project_id, ProjectMember.user_id
+                ).filter(ProjectMember.project_id.in_(batch))
+            )
+        
+        now = datetime.utcnow()
+        inserts = [
+            {'project_id': project_id, 'user_id': user_id, 'last_synced': now, 'created_at': now}
+            for project_id, user_id in desired - set(existing)
+        ]
+        removed_ids = [member_id for pair, member_id in existing.items() if pair not in desired]
+        
+        for batch in _batches(inserts, self.batch_size):
+            db.session.bulk_insert_mappings(ProjectMember, batch)
+        for batch in _batches(removed_ids, self.batch_size):
+            db.session.query(ProjectMember).filter(ProjectMember.id.in_(batch)).delete(
+                synchronize_session=False
+            )
+        if inserts or removed_ids:
+            response_cache.invalidate()
+        
+        log.status = 'success' if len(actors_by_project) == len(projects_by_key) else 'partial'
+        log.records_processed = len(desired)
+        log.records_created = len(inserts)
+        log.records_updated = len(removed_ids)
+        log.completed_at = datetime.utcnow()
+        
+        db.session.commit()
+        return {'status': log.status, 'created': len(inserts), 'removed': len(removed_ids),
+                'total': len(desired), 'projects': len(actors_by_project)}
+    
+    def _prepare_worklogs(self) -> Dict:
+        state_key = f"tempo_worklogs:{self.tempo_client.base_url}"
+        return {'state_key': state_key, 'watermark': SyncState.get_value(state_key)}
+    
+    def _fetch_worklogs(self, context: Dict) -> Iterator[List[Dict]]:
+        if context['watermark']:
+            return self.tempo_client.iter_worklogs(updated_from=context['watermark'])
+        # Pierwsze okno liczone od dzisiaj w strefie zespołu, nie w strefie serwera
+        today = working_calendar.today()
+        initial_from = today - timedelta(days=Config.TEMPO_WORKLOG_INITIAL_DAYS)
+        return self.tempo_client.iter_worklogs(start_date=initial_from.isoformat(),
+                                               end_date=today.isoformat())
+    
+    def _apply_worklogs(self, log: SyncLog, context: Dict, pages: Iterable[List[Dict]]) -> Dict:
+        users_by_account = dict(db.session.query(User.jira_account_id, User.id))
+        processed = 0
+        created = 0
+        updated = 0
+        
+        # Strony są zapisywane od razu, więc pamięć nie rośnie z zakresem dat
+        for page in pages:
+            incoming = {}
+            for worklog in page:
+                worklog_id = worklog.get('tempoWorklogId') or worklog.get('id') or worklog.get('jiraWorklogId')
+                if worklog_id is None or not worklog.get('startDate'):
                     continue
-                
-                project = Project.query.filter_by(jira_key=project_key).first()
-                
-                if project:
-                    # Aktualizuj istniejący projekt
-                    project.name = jira_project.get('name', project.name)
-                    project.description = jira_project.get('description', project.description)
-                    project.project_type = jira_project.get('projectTypeKey', project.project_type)
-                    project.lead_email = jira_project.get('lead', {}).get('emailAddress', project.lead_email)
-                    project.avatar_url = jira_project.get('avatarUrls', {}).get('48x48', project.avatar_url)
-                    project.is_active = True
-                    project.last_synced = datetime.utcnow()
-                    project.updated_at = datetime.utcnow()
-                    updated += 1
-                else:
-                    # Utwórz nowy projekt
-                    project = Project(
-                        jira_key=project_key,
-                        name=jira_project.get('name', ''),
-                        description=jira_project.get('description', ''),
-                        project_type=jira_project.get('projectTypeKey'),
-                        lead_email=jira_project.get('lead', {}).get('emailAddress'),
-                        avatar_url=jira_project.get('avatarUrls', {}).get('48x48'),
-                        is_active=True,
-                        last_synced=datetime.utcnow()
-                    )
-                    db.session.add(project)
-                    created += 1
-            
-            log.status = 'success'
-            log.records_processed = len(jira_projects)
-            log.records_created = created
-            log.records_updated = updated
-            log.completed_at = datetime.utcnow()
-            
-            db.session.commit()
-            return {'status': 'success', 'created': created, 'updated': updated, 'total': len(jira_projects)}
+                incoming[str(worklog_id)] = _worklog_values(worklog, users_by_account)
             
-        except Exception as e:
-            log.status = 'error'
-            log.error_message = str(e)
-            log.completed_at = datetime.utcnow()
-            db.session.commit()
-            return {'status': 'error', 'error': str(e)}
+            page_created, page_updated = self._bulk_reconcile(
+                Worklog, 'tempo_worklog_id', incoming, WORKLOG_DEFAULTS, scoped=True
+            )
+            processed += len(page)
+            created += page_created
+            updated += page_updated
+        
+        # Znacznik przesuwany dopiero po udanym zapisie (czas rozpoczęcia tej synchronizacji)
+        SyncState.set_value(context['state_key'], log.started_at.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        
+        log.status = 'success'
+        log.records_processed = processed
+        log.records_created = created
+        log.records_updated = updated
+        log.completed_at = datetime.utcnow()
+        
+        db.session.commit()
+        return {'status': 'success', 'created': created, 'updated': updated, 'total': processed}
+    
+    # ========== Synchronizacja ==========
+    
+    def sync_projects(self) -> Dict:
+        """Synchronizuje projekty z Jiry"""
+        return self._run_stage(SyncStage('projects', 'jira_projects', self._fetch_projects, self._apply_projects))
     
     def sync_users(self) -> Dict:
         """Synchronizuje użytkowników z Jiry"""
-        log = SyncLog(
-            sync_type='jira_users',
-            status='running',
-            started_at=datetime.utcnow()
-        )
-        db.session.add(log)
-        db.session.flush()
+        return self._run_stage(SyncStage('users', 'jira_users', self._fetch_users, self._apply_users))
+    
+    def sync_project_members(self) -> Dict:
+        """Synchronizuje członkostwo użytkowników w projektach (rola 'Users').
         
-        try:
-            jira_users = self.jira_client.get_all_users()
-            created = 0
-            updated = 0
-            
-            for jira_user in jira_users:
-                account_id = jira_user.get('accountId')
-                if not account_id:
-                    continue
-                
-                user = User.query.filter_by(jira_account_id=account_id).first()
-                
-                if user:
-                    # Aktualizuj istniejącego użytkownika
-                    user.email = jira_user.get('emailAddress', user.email)
-                    user.display_name = jira_user.get('displayName', user.display_name)
-                    user.avatar_url = jira_user.get('avatarUrls', {}).get('48x48', user.avatar_url)
-                    user.is_active = jira_user.get('active', True)
-                    user.last_synced = datetime.utcnow()
-                    user.updated_at = datetime.utcnow()
-                    updated += 1
+        Aktorzy wszystkich aktywnych projektów pobierani są równolegle, a
+        członkostwa uzgadniane z bazą hurtowo. Projekty, których nie udało się
+        pobrać z Jiry, pozostają bez zmian.
+        """
+        return self._run_stage(SyncStage('project_members', 'jira_project_members',
+                                         self._fetch_project_members, self._apply_project_members,
+                                         prepare=self._prepare_project_members))
+    
+    def sync_worklogs(self) -> Dict:
+        """Synchronizuje przyrostowo worklogi z Tempo.
+        
+        Pobierane są tylko worklogi zmienione od ostatniej udanej synchronizacji
+        (znacznik updatedFrom zapisany w SyncState per instancja Jira). Przy
+        pierwszym uruchomieniu pobierany jest okres TEMPO_WORKLOG_INITIAL_DAYS.
+        """
+        if not self.tempo_client:
+            return {'status': 'skipped', 'error': 'Tempo nie jest skonfigurowane'}
+        
+        return self._run_stage(SyncStage('worklogs', 'tempo_worklogs', self._fetch_worklogs, self._apply_worklogs,
+                                         prepare=self._prepare_worklogs))
+    
+    def sync_all(self) -> Dict:
+        """Synchronizuje wszystkie dane.
+        
+        Pobrania z Jiry i Tempo biegną równolegle w wątkach, a zapisy do bazy
+        wykonywane są kolejno w bieżącym wątku, gdy etapy, od których zależy
+        dany etap, są już zapisane. Czas całości zbliża się do czasu
+        najwolniejszego pobrania zamiast sumy wszystkich etapów.
+        """
+        stages = self._stages()
+        results: Dict[str, Dict] = {}
+        started: Dict[str, Tuple[SyncLog, object, Optional[_PrefetchedPages], Future]] = {}
+        
+        with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix='sync') as executor:
+            def start(stage: SyncStage):
+                log = self._start_log(stage.sync_type)
+                try:
+                    context = stage.prepare() if stage.prepare else None
+                except Exception as e:
+                    results[stage.name] = self._fail_log(log, e)
+                    return
+                if stage.streaming:
+                    pages = _PrefetchedPages()
+                    future = executor.submit(pages.fill, stage.fetch, context)
+                    started[stage.name] = (log, context, pages, future)
                 else:
-                    # Utwórz nowego użytkownika
-                    user = User(
-                        jira_account_id=account_id,
-                        email=jira_user.get('emailAddress', ''),
-                        display_name=jira_user.get('displayName', ''),
-                        avatar_url=jira_user.get('avatarUrls', {}).get('48x48'),
-                        is_active=jira_user.get('active', True),
-                        last_synced=datetime.utcnow()
-                    )
-                    db.session.add(user)
-                    created += 1
+                    started[stage.name] = (log, context, None, executor.submit(stage.fetch, context))
             
-            log.status = 'success'
-            log.records_processed = len(jira_users)
-            log.records_created = created
-            log.records_updated = updated
-            log.completed_at = datetime.utcnow()
+            def stop_fetch(name: str):
+                _, _, pages, future = started[name]
+                future.cancel()
+                if pages is not None:
+                    pages.cancel()
             
-            db.session.commit()
-            return {'status': 'success', 'created': created, 'updated': updated, 'total': len(jira_users)}
+            def failed_dependency(stage: SyncStage) -> Optional[str]:
+                return next((name for name in stage.depends_on
+                             if results.get(name, {}).get('status') in FAILED_STAGE_STATUSES), None)
             
-        except Exception as e:
-            log.status = 'error'
-            log.error_message = str(e)
-            log.completed_at = datetime.utcnow()
-            db.session.commit()
-            return {'status': 'error', 'error': str(e)}
-    
-    def sync_all(self) -> Dict:
-        """Synchronizuje wszystkie dane"""
-        results = {
-            'projects': self.sync_projects(),
-            'users': self.sync_users()
-        }
-        return results
-
+            def skip(stage: SyncStage, dependency: str):
+                if stage.name in started:
+                    stop_fetch(stage.name)
+                    log = started[stage.name][0]
+                else:
+                    log = self._start_log(stage.sync_type)
+                results[stage.name] = self._skip_log(log, f'Pominięto - etap {dependency} zakończył się błędem')
+            
+            def dependencies_done(stage: SyncStage) -> bool:
+                return all(name in results for name in stage.depends_on)
+            
+            try:
+                for stage in stages:
+                    if not stage.fetch_after_dependencies:
+                        start(stage)
+                
+                while len(results) < len(stages):
+                    # Etap zależny od nieudanego etapu zapisywałby dane na nieaktualnych mapowaniach
+                    for stage in stages:
+                        dependency = stage.name not in results and failed_dependency(stage)
+                        if dependency:
+                            skip(stage, dependency)
+                    
+                    for stage in stages:
+                        if stage.name not in results and stage.name not in started and dependencies_done(stage):
+                            start(stage)
+                    
+                    ready = [stage for stage in stages
+                             if stage.name in started and stage.name not in results and dependencies_done(stage)]
+                    # Etapy strumieniowe zapisują strony w trakcie pobierania, pozostałe czekają na całość
+                    stage = next((s for s in ready if s.streaming or started[s.name][3].done()), None)
+                    if stage is None:
+                        wait([started[s.name][3] for s in ready], return_when=FIRST_COMPLETED)
+                        continue
+                    
+                    log, context, pages, future = started[stage.name]
+                    try:
+                        data = pages if stage.streaming else future.result()
+                        results[stage.name] = stage.apply(log, context, data)
+                    except Exception as e:
+                        if pages is not None:
+                            pages.cancel()
+                        results[stage.name] = self._fail_log(log, e)
+            finally:
+                # Wyjątek poza etapami nie może zostawić wątków czekających na miejsce w kolejce
+                # stron - zamknięcie puli czekałoby na nie bez końca
+                for name in started:
+                    if name not in results:
+                        stop_fetch(name)
+        
+        return {stage.name: results[stage.name] for stage in stages}
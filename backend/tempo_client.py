@@ -1,81 +1,242 @@
 """Klient do komunikacji z Tempo API"""
+import json
+import os
+import threading
+import time
 import requests
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Optional
 from datetime import datetime, date
+from .config import Config
+from .http_session import get_shared_session
+
+# Statusy oznaczające, że zapamiętany endpoint przestał istnieć
+STALE_ENDPOINT_STATUSES = (404, 410)
+
+_cache_file_lock = threading.Lock()
 
 
 class TempoClient:
     """Klient do komunikacji z Tempo API"""
     
-    def __init__(self, base_url: str, api_token: str):
+    def __init__(self, base_url: str, api_token: str,
+                 session: Optional[requests.Session] = None):
         self.base_url = base_url.rstrip('/')
         self.api_token = api_token
         self.headers = {
             'Authorization': f'Bearer {api_token}',
             'Content-Type': 'application/json'
         }
+        self.session = session or get_shared_session()
+        self.timeout = Config.HTTP_TIMEOUT
+        self.page_size = Config.TEMPO_PAGE_SIZE
         # Różne możliwe endpointy Tempo API
         self.api_urls = [
             f"{self.base_url}/rest/tempo-timesheets/4",
             f"{self.base_url}/rest/tempo-timesheets/3",
             f"{self.base_url}/rest/tempo-core/1"
         ]
+        # Wykryte działające endpointy: rodzaj -> (szablon URL, czas wykrycia)
+        self.cache_file = Config.TEMPO_ENDPOINT_CACHE_FILE
+        self.cache_ttl = Config.TEMPO_ENDPOINT_CACHE_TTL
+        self._endpoints = self._load_endpoint_cache()
     
-    def get_worklogs(self, start_date: Optional[str] = None,
-                     end_date: Optional[str] = None,
-                     project_key: Optional[str] = None,
-                     user_account_id: Optional[str] = None) -> List[Dict]:
-        """Pobiera worklogi z Tempo"""
-        for api_url in self.api_urls:
+    # ========== Wykrywanie endpointów ==========
+    
+    def _load_endpoint_cache(self) -> Dict[str, tuple]:
+        """Wczytuje zapamiętane endpointy tej instancji Tempo z pliku"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file) as f:
+                entries = json.load(f).get(self.base_url, {})
+            return {kind: (entry['endpoint'], entry['discovered_at']) for kind, entry in entries.items()}
+        except Exception as e:
+            print(f"Nie udało się wczytać cache endpointów Tempo: {e}")
+            return {}
+    
+    def _save_endpoint_cache(self):
+        """Zapisuje wykryte endpointy do pliku (atomowo)"""
+        if not self.cache_file:
+            return
+        with _cache_file_lock:
             try:
-                params = {}
-                if project_key:
-                    params['projectKey'] = project_key
-                if start_date:
-                    params['from'] = start_date
-                if end_date:
-                    params['to'] = end_date
-                if user_account_id:
-                    params['accountId'] = user_account_id
-                
-                endpoints = [
-                    f"{api_url}/worklogs",
-                    f"{api_url}/worklogs/search",
-                    f"{self.base_url}/rest/tempo-timesheets/4/worklogs"
-                ]
-                
-                for endpoint in endpoints:
-                    try:
-                        response = requests.get(
-                            endpoint,
-                            headers=self.headers,
-                            params=params,
-                            timeout=30
-                        )
-                        if response.status_code == 200:
-                            data = response.json()
-                            if isinstance(data, list):
-                                return data
-                            elif isinstance(data, dict) and 'results' in data:
-                                return data['results']
-                            elif isinstance(data, dict) and 'worklogs' in data:
-                                return data['worklogs']
-                            return data if isinstance(data, list) else []
-                    except requests.exceptions.RequestException:
-                        continue
+                data = {}
+                if os.path.exists(self.cache_file):
+                    with open(self.cache_file) as f:
+                        data = json.load(f)
+                data[self.base_url] = {
+                    kind: {'endpoint': endpoint, 'discovered_at': discovered_at}
+                    for kind, (endpoint, discovered_at) in self._endpoints.items()
+                }
+                tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.cache_file)
             except Exception as e:
-                print(f"Błąd podczas pobierania worklogów z {api_url}: {e}")
+                print(f"Nie udało się zapisać cache endpointów Tempo: {e}")
+    
+    def _cached_endpoint(self, kind: str) -> Optional[str]:
+        """Zwraca zapamiętany endpoint, jeśli nie minął jego TTL"""
+        entry = self._endpoints.get(kind)
+        if not entry:
+            return None
+        endpoint, discovered_at = entry
+        if time.time() - discovered_at > self.cache_ttl:
+            return None
+        return endpoint
+    
+    def _remember_endpoint(self, kind: str, endpoint: Optional[str]):
+        """Zapamiętuje (lub zapomina) działający endpoint danego rodzaju"""
+        if endpoint:
+            self._endpoints[kind] = (endpoint, time.time())
+        else:
+            self._endpoints.pop(kind, None)
+        self._save_endpoint_cache()
+    
+    def _get_discovered(self, kind: str, candidates: List[str],
+                        params: Optional[Dict] = None, **url_args):
+        """Wykonuje GET na zapamiętanym endpoincie lub wykrywa działający.
+        
+        Kandydaci to szablony URL (formatowane przez url_args). Ponowne
+        wykrywanie następuje tylko po odpowiedzi 404/410 lub po upływie TTL.
+        Zwraca zdekodowany JSON albo None.
+        """
+        endpoint = self._cached_endpoint(kind)
+        if endpoint:
+            try:
+                response = self.session.get(
+                    endpoint.format(**url_args),
+                    headers=self.headers,
+                    params=params,
+                    timeout=self.timeout
+                )
+                if response.status_code == 200:
+                    return response.json()
+                if response.status_code not in STALE_ENDPOINT_STATUSES:
+                    print(f"Tempo API zwróciło status {response.status_code} dla {kind}")
+                    return None
+            except requests.exceptions.RequestException as e:
+                print(f"Błąd połączenia z Tempo API ({kind}): {e}")
+                return None
+            self._remember_endpoint(kind, None)
+        
+        for candidate in dict.fromkeys(candidates):
+            try:
+                response = self.session.get(
+                    candidate.format(**url_args),
+                    headers=self.headers,
+                    params=params,
+                    timeout=self.timeout
+                )
+                if response.status_code == 200:
+                    self._remember_endpoint(kind, candidate)
+                    return response.json()
+            except requests.exceptions.RequestException:
                 continue
         
-        print("Nie udało się połączyć z Tempo API. Sprawdź konfigurację.")
+        return None
+    
+    @staticmethod
+    def _extract_results(data, *keys) -> List[Dict]:
+        """Wyciąga listę rekordów z odpowiedzi Tempo (lista lub słownik z wynikami)"""
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict):
+            for key in keys:
+                if key in data:
+                    return data[key]
         return []
     
+    # ========== Dane ==========
+    
+    def _get_json(self, url: str, params: Optional[Dict] = None):
+        """Wykonuje GET i zwraca zdekodowany JSON (zgłasza wyjątek przy błędzie HTTP)"""
+        response = self.session.get(url, headers=self.headers, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+    
+    def iter_worklogs(self, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None,
+                      project_key: Optional[str] = None,
+                      user_account_id: Optional[str] = None,
+                      updated_from: Optional[str] = None,
+                      page_size: Optional[int] = None) -> Iterator[List[Dict]]:
+        """Leniwie przechodzi po wszystkich stronach worklogów, zwracając je stronami.
+        
+        Kolejna strona (metadata.next lub offset/limit) jest pobierana w tle,
+        gdy wywołujący przetwarza bieżącą, więc w pamięci są najwyżej dwie strony.
+        Zgłasza wyjątek, gdy Tempo API jest niedostępne.
+        """
+        limit = page_size or self.page_size
+        params = {'offset': 0, 'limit': limit}
+        if project_key:
+            params['projectKey'] = project_key
+        if start_date:
+            params['from'] = start_date
+        if end_date:
+            params['to'] = end_date
+        if user_account_id:
+            params['accountId'] = user_account_id
+        if updated_from:
+            params['updatedFrom'] = updated_from
+        
+        candidates = []
+        for api_url in self.api_urls:
+            candidates.extend([
+                f"{api_url}/worklogs",
+                f"{api_url}/worklogs/search",
+                f"{self.base_url}/rest/tempo-timesheets/4/worklogs"
+            ])
+        
+        data = self._get_discovered('worklogs', candidates, params)
+        if data is None:
+            raise RuntimeError("Nie udało się połączyć z Tempo API. Sprawdź konfigurację.")
+        endpoint = self._cached_endpoint('worklogs')
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            previous_first = None
+            while True:
+                page = self._extract_results(data, 'results', 'worklogs')
+                if not page or page[0] == previous_first:
+                    break
+                previous_first = page[0]
+                
+                # Wyznacz i pobierz w tle następną stronę
+                future = None
+                next_url = data.get('metadata', {}).get('next') if isinstance(data, dict) else None
+                if next_url:
+                    future = executor.submit(self._get_json, next_url)
+                elif len(page) >= limit and endpoint:
+                    params = {**params, 'offset': params['offset'] + limit}
+                    future = executor.submit(self._get_json, endpoint, params)
+                
+                yield page
+                
+                if future is None:
+                    break
+                data = future.result()
+    
+    def get_worklogs(self, start_date: Optional[str] = None,
+                     end_date: Optional[str] = None,
+                     project_key: Optional[str] = None,
+                     user_account_id: Optional[str] = None) -> List[Dict]:
+        """Pobiera worklogi z Tempo (wszystkie strony)"""
+        try:
+            worklogs = []
+            for page in self.iter_worklogs(start_date, end_date, project_key, user_account_id):
+                worklogs.extend(page)
+            return worklogs
+        except Exception as e:
+            print(f"Błąd podczas pobierania worklogów: {e}")
+            return []
+    
     def get_planner_data(self, start_date: Optional[str] = None,
                          end_date: Optional[str] = None) -> List[Dict]:
         """Pobiera dane z Tempo Planner (planowane zadania)"""
         try:
             # Tempo Planner API może być dostępne pod różnymi endpointami
-            endpoints = [
+            candidates = [
                 f"{self.base_url}/rest/tempo-planning/1/plan",
                 f"{self.base_url}/rest/tempo-core/1/plan",
             ]
@@ -86,23 +247,9 @@ class TempoClient:
             if end_date:
                 params['to'] = end_date
             
-            for endpoint in endpoints:
-                try:
-                    response = requests.get(
-                        endpoint,
-                        headers=self.headers,
-                        params=params,
-                        timeout=30
-                    )
-                    if response.status_code == 200:
-                        data = response.json()
-                        if isinstance(data, list):
-                            return data
-                        elif isinstance(data, dict) and 'results' in data:
-                            return data['results']
-                        return data if isinstance(data, list) else []
-                except requests.exceptions.RequestException:
-                    continue
+            data = self._get_discovered('planner', candidates, params)
+            if data is not None:
+                return self._extract_results(data, 'results')
         except Exception as e:
             print(f"Błąd podczas pobierania danych z Tempo Planner: {e}")
         
@@ -110,32 +257,19 @@ class TempoClient:
     
     def get_team_members(self, team_id: Optional[str] = None) -> List[Dict]:
         """Pobiera członków zespołu z Tempo"""
+        if not team_id:
+            return []
+        
         try:
-            endpoints = [
-                f"{self.base_url}/rest/tempo-teams/2/team/{team_id}/member" if team_id else None,
-                f"{self.base_url}/rest/tempo-core/1/team/{team_id}/member" if team_id else None,
+            candidates = [
+                f"{self.base_url}/rest/tempo-teams/2/team/{{team_id}}/member",
+                f"{self.base_url}/rest/tempo-core/1/team/{{team_id}}/member",
             ]
             
-            for endpoint in endpoints:
-                if not endpoint:
-                    continue
-                try:
-                    response = requests.get(
-                        endpoint,
-                        headers=self.headers,
-                        timeout=30
-                    )
-                    if response.status_code == 200:
-                        data = response.json()
-                        if isinstance(data, list):
-                            return data
-                        elif isinstance(data, dict) and 'results' in data:
-                            return data['results']
-                        return data if isinstance(data, list) else []
-                except requests.exceptions.RequestException:
-                    continue
+            data = self._get_discovered('team_members', candidates, team_id=team_id)
+            if data is not None:
+                return self._extract_results(data, 'results')
         except Exception as e:
             print(f"Błąd podczas pobierania członków zespołu: {e}")
         
         return []
-
@@ -0,0 +1,82 @@
+"""Worker synchronizacji - wykonuje zadania z kolejki sync_jobs poza procesem WWW
+
+Uruchomienie: python -m backend.worker
+"""
+import os
+import signal
+import time
+
+# Import aplikacji nie może uruchomić schedulera w procesie workera
+os.environ['SYNC_WORKER_PROCESS'] = '1'
+
+from .app import app, sync_service
+from .config import Config
+from .job_lock import OWNER_ID, job_lock
+from . import daily_capacity, sync_jobs
+
+# Synchronizacje nie mogą biec równolegle (wyścigi przy upsertach), także między workerami
+SYNC_LOCK_NAME = 'sync_jira_tempo'
+
+
+class Worker:
+    """Pętla pobierająca zadania z kolejki do czasu sygnału zatrzymania"""
+    
+    def __init__(self):
+        self.running = True
+    
+    def stop(self, *_):
+        """Kończy pracę po bieżącym zadaniu"""
+        print("Zatrzymywanie workera po bieżącym zadaniu...")
+        self.running = False
+    
+    def maintain(self):
+        """Prace porządkowe przed każdym pobraniem z kolejki (błąd jednej nie blokuje pozostałych)"""
+        with app.app_context():
+            # Zadania wiszące dłużej niż SYNC_JOB_TIMEOUT także wtedy, gdy blokadę trzyma inny worker
+            try:
+                sync_jobs.fail_abandoned()
+            except Exception as e:
+                print(f"Błąd podczas sprawdzania porzuconych zadań: {e}")
+            # Budowa tabeli dziennego obłożenia i przesuwanie jej horyzontu (poza żądaniami WWW)
+            try:
+                daily_capacity.materialize()
+            except Exception as e:
+                print(f"Błąd podczas materializacji dziennego obłożenia: {e}")
+    
+    def run_once(self) -> bool:
+        """Wykonuje jedno zadanie; zwraca False, gdy nie było nic do zrobienia"""
+        with app.app_context():
+            with job_lock(SYNC_LOCK_NAME) as acquired:
+                if not acquired:
+                    return False
+                sync_jobs.fail_interrupted()
+                job = sync_jobs.claim_next(OWNER_ID)
+                if job is None:
+                    return False
+                print(f"Rozpoczynam synchronizację {job.job_type} (zadanie {job.id})...")
+                sync_jobs.run_job(sync_service, job)
+                return True
+    
+    def run(self):
+        print(f"✓ Worker synchronizacji uruchomiony ({OWNER_ID})")
+        
+        while self.running:
+            self.maintain()
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                print(f"Błąd workera synchronizacji: {e}")
+                processed = False
+            if not processed and self.running:
+                time.sleep(Config.SYNC_WORKER_POLL_SECONDS)
+
+
+def main():
+    worker = Worker()
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
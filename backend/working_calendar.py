@@ -0,0 +1,136 @@
+"""Kalendarz dni roboczych ze strefami czasowymi (maski dni współdzielone między żądaniami)"""
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pytz
+
+from .config import Config
+from .models import db, Holiday
+
+# Liczba zapamiętanych masek (strefa/zbiór świąt/zakres)
+MASK_CACHE_SIZE = 256
+
+# Domyślna długość zakresu dat, gdy żądanie nie podaje end_date
+DEFAULT_RANGE_DAYS = 30
+
+
+@lru_cache(maxsize=64)
+def _resolve_timezone(name: str):
+    return pytz.timezone(name)
+
+
+def is_valid_timezone(name: Optional[str]) -> bool:
+    """Czy nazwa strefy jest znana bazie pytz"""
+    if not name:
+        return False
+    try:
+        _resolve_timezone(name)
+        return True
+    except pytz.UnknownTimeZoneError:
+        return False
+
+
+def get_timezone(name: Optional[str] = None):
+    """Zwraca strefę czasową; pusta lub nieznana nazwa oznacza Config.DEFAULT_TIMEZONE"""
+    if is_valid_timezone(name):
+        return _resolve_timezone(name)
+    return _resolve_timezone(Config.DEFAULT_TIMEZONE)
+
+
+def timezone_name(name: Optional[str] = None) -> str:
+    """Kanoniczna nazwa strefy (klucz masek i świąt regionalnych)"""
+    return get_timezone(name).zone
+
+
+def today(tz_name: Optional[str] = None) -> date:
+    """Dzisiejsza data w podanej strefie (domyślnie strefa zespołu)"""
+    return datetime.now(get_timezone(tz_name)).date()
+
+
+def parse_date_range(start_value: Optional[str], end_value: Optional[str],
+                     tz_name: Optional[str] = None,
+                     default_days: int = DEFAULT_RANGE_DAYS) -> Tuple[date, date]:
+    """Parsuje zakres dat żądania; brakujące granice liczone są od dzisiaj w strefie tz_name.
+    
+    Rzuca ValueError przy nieprawidłowej dacie lub końcu przed początkiem.
+    """
+    current = today(tz_name)
+    start = datetime.fromisoformat(start_value).date() if start_value else current
+    end = datetime.fromisoformat(end_value).date() if end_value else current + timedelta(days=default_days)
+    if end < start:
+        raise ValueError('end_date nie może być wcześniejsza niż start_date')
+    return start, end
+
+
+@lru_cache(maxsize=MASK_CACHE_SIZE)
+def _working_mask(start: date, end: date, holidays: FrozenSet[date]) -> np.ndarray:
+    days = max((end - start).days + 1, 0)
+    weekdays = (np.arange(days) + start.weekday()) % 7
+    mask = weekdays < 5
+    
+    offsets = [(holiday - start).days for holiday in holidays if start <= holiday <= end]
+    mask[offsets] = False
+    # Maska jest współdzielona między żądaniami - tylko do odczytu
+    mask.setflags(write=False)
+    return mask
+
+
+def working_mask(start: date, end: date, holidays: Iterable[date] = ()) -> np.ndarray:
+    """Zwraca maskę dni roboczych zakresu [start, end] (bez weekendów i świąt).
+    
+    Wynik jest zapamiętywany, więc zakresy z tym samym zbiorem świąt dostają
+    ten sam obiekt tablicy.
+    """
+    return _working_mask(start, end, frozenset(holidays))
+
+
+class WorkingCalendar:
+    """Dni robocze zakresu dat dla stref czasowych zespołu.
+    
+    Święta bez strefy obowiązują wszystkich, święta ze strefą tylko
+    użytkowników pracujących w tej strefie. Użytkownicy z tej samej strefy
+    współdzielą jedną maskę.
+    """
+    
+    def __init__(self, start: date, end: date, holidays: Iterable[Tuple[date, Optional[str]]] = ()):
+        self.start = start
+        self.end = end
+        self._common = set()
+        self._regional: Dict[str, set] = {}
+        for day, tz_name in holidays:
+            if tz_name:
+                self._regional.setdefault(timezone_name(tz_name), set()).add(day)
+            else:
+                self._common.add(day)
+    
+    @classmethod
+    def load(cls, start: date, end: date) -> 'WorkingCalendar':
+        """Buduje kalendarz ze świąt zapisanych w bazie"""
+        holidays = db.session.query(Holiday.date, Holiday.timezone).filter(Holiday.date.between(start, end)).all()
+        return cls(start, end, holidays)
+    
+    def holidays(self, tz_name: Optional[str] = None) -> FrozenSet[date]:
+        """Święta obowiązujące w strefie"""
+        return frozenset(self._common | self._regional.get(timezone_name(tz_name), set()))
+    
+    def mask(self, tz_name: Optional[str] = None) -> np.ndarray:
+        """Maska dni roboczych dla strefy (domyślnie strefa zespołu)"""
+        return _working_mask(self.start, self.end, self.holidays(tz_name))
+    
+    def masks(self, user_timezones: Dict[int, Optional[str]]) -> Dict[int, np.ndarray]:
+        """Maski dni roboczych użytkowników (user_id -> maska jego strefy)"""
+        by_timezone = {}
+        result = {}
+        for user_id, tz_name in user_timezones.items():
+            key = timezone_name(tz_name)
+            if key not in by_timezone:
+                by_timezone[key] = self.mask(key)
+            result[user_id] = by_timezone[key]
+        return result
+    
+    def non_working_days(self, tz_name: Optional[str] = None) -> List[str]:
+        """Lista dni wolnych zakresu (ISO) dla strefy"""
+        mask = self.mask(tz_name)
+        return [(self.start + timedelta(days=offset)).isoformat() for offset in np.flatnonzero(~mask).tolist()]
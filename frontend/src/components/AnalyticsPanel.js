@@ -5,10 +5,13 @@ import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, Responsive
 import axios from 'axios';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || '/api';
+const EXPORT_POLL_INTERVAL_MS = 1000;
 
 const AnalyticsPanel = () => {
   const [overloadData, setOverloadData] = useState(null);
   const [loading, setLoading] = useState(false);
+  const [exporting, setExporting] = useState(null);
+  const [exportError, setExportError] = useState(null);
 
   useEffect(() => {
     loadAnalytics();
@@ -31,18 +34,47 @@ const AnalyticsPanel = () => {
     }
   };
 
+  const formatPeriod = (item) => (
+    item.start_date === item.end_date ? item.start_date : `${item.start_date} – ${item.end_date} (${item.days} dni)`
+  );
+
   const handleExport = async (format) => {
+    setExporting(format);
+    setExportError(null);
     try {
       const startDate = new Date().toISOString().split('T')[0];
       const endDate = new Date(Date.now() + 30 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
       
-      const url = `${API_BASE_URL}/export/allocations/${format}?start_date=${startDate}&end_date=${endDate}`;
-      window.open(url, '_blank');
+      // Raport renderowany jest w tle - czekamy na gotowy plik
+      let { data: job } = await axios.post(`${API_BASE_URL}/export/jobs`, {
+        format,
+        start_date: startDate,
+        end_date: endDate
+      });
+      while (job.status === 'pending' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, EXPORT_POLL_INTERVAL_MS));
+        ({ data: job } = await axios.get(`${API_BASE_URL}/export/jobs/${job.id}`));
+      }
+      
+      if (job.status === 'done') {
+        window.open(job.download_url, '_blank');
+      } else {
+        setExportError(job.error_message || 'Eksport nie powiódł się');
+      }
     } catch (error) {
       console.error('Błąd podczas eksportu:', error);
+      setExportError('Eksport nie powiódł się');
+    } finally {
+      setExporting(null);
     }
   };
 
+  const handleHeatmapExport = (format) => {
+    const startDate = new Date().toISOString().split('T')[0];
+    const endDate = new Date(Date.now() + 90 * 24 * 60 * 60 * 1000).toISOString().split('T')[0];
+    window.open(`${API_BASE_URL}/export/heatmap/${format}?start_date=${startDate}&end_date=${endDate}`, '_blank');
+  };
+
   return (
     <Box>
       <Paper sx={{ p: 3, mb: 3 }}>
@@ -55,19 +87,41 @@ const AnalyticsPanel = () => {
               variant="outlined"
               startIcon={<DownloadIcon />}
               onClick={() => handleExport('excel')}
+              disabled={exporting !== null}
             >
-              Eksport Excel
+              {exporting === 'excel' ? 'Przygotowywanie...' : 'Eksport Excel'}
             </Button>
             <Button
               variant="outlined"
               startIcon={<DownloadIcon />}
               onClick={() => handleExport('pdf')}
+              disabled={exporting !== null}
             >
-              Eksport PDF
+              {exporting === 'pdf' ? 'Przygotowywanie...' : 'Eksport PDF'}
+            </Button>
+            <Button
+              variant="outlined"
+              startIcon={<DownloadIcon />}
+              onClick={() => handleHeatmapExport('excel')}
+            >
+              Mapa obłożenia Excel
+            </Button>
+            <Button
+              variant="outlined"
+              startIcon={<DownloadIcon />}
+              onClick={() => handleHeatmapExport('csv')}
+            >
+              Mapa obłożenia CSV
             </Button>
           </Box>
         </Box>
 
+        {exportError && (
+          <Alert severity="error" sx={{ mb: 2 }}>
+            {exportError}
+          </Alert>
+        )}
+
         {overloadData && (
           <>
             <Box sx={{ mb: 3 }}>
@@ -76,11 +130,11 @@ const AnalyticsPanel = () => {
               </Typography>
               <Box sx={{ display: 'flex', gap: 2 }}>
                 <Chip
-                  label={`Przeciążenia: ${overloadData.summary.total_overloaded_days}`}
+                  label={`Przeciążenia: ${overloadData.summary.total_overloaded_days} dni rob. (${overloadData.summary.total_overload_hours} h)`}
                   color="error"
                 />
                 <Chip
-                  label={`Niedobory: ${overloadData.summary.total_underutilized_days}`}
+                  label={`Niedobory: ${overloadData.summary.total_underutilized_days} dni rob. (${overloadData.summary.total_free_hours} h)`}
                   color="warning"
                 />
               </Box>
@@ -96,19 +150,21 @@ const AnalyticsPanel = () => {
                     <TableHead>
                       <TableRow>
                         <TableCell>Użytkownik</TableCell>
-                        <TableCell>Data</TableCell>
+                        <TableCell>Okres</TableCell>
                         <TableCell>Alokacja</TableCell>
+                        <TableCell>Godziny (plan / dostępne)</TableCell>
                         <TableCell>Sugestia</TableCell>
                       </TableRow>
                     </TableHead>
                     <TableBody>
                       {overloadData.overloaded.slice(0, 10).map((item, idx) => (
                         <TableRow key={idx}>
-                          <TableCell>{item.user?.display_name}</TableCell>
-                          <TableCell>{item.date}</TableCell>
+                          <TableCell>{overloadData.users[item.user_id]?.display_name}</TableCell>
+                          <TableCell>{formatPeriod(item)}</TableCell>
                           <TableCell>
                             <Chip label={`${item.total_allocation.toFixed(1)}%`} color="error" size="small" />
                           </TableCell>
+                          <TableCell>{`${item.allocated_hours.toFixed(1)} h / ${item.available_hours.toFixed(1)} h`}</TableCell>
                           <TableCell>{item.suggestion}</TableCell>
                         </TableRow>
                       ))}
@@ -128,7 +184,7 @@ const AnalyticsPanel = () => {
                     <TableHead>
                       <TableRow>
                         <TableCell>Użytkownik</TableCell>
-                        <TableCell>Data</TableCell>
+                        <TableCell>Okres</TableCell>
                         <TableCell>Alokacja</TableCell>
                         <TableCell>Dostępna pojemność</TableCell>
                       </TableRow>
@@ -136,11 +192,11 @@ const AnalyticsPanel = () => {
                     <TableBody>
                       {overloadData.underutilized.slice(0, 10).map((item, idx) => (
                         <TableRow key={idx}>
-                          <TableCell>{item.user?.display_name}</TableCell>
-                          <TableCell>{item.date}</TableCell>
+                          <TableCell>{overloadData.users[item.user_id]?.display_name}</TableCell>
+                          <TableCell>{formatPeriod(item)}</TableCell>
                           <TableCell>{item.total_allocation.toFixed(1)}%</TableCell>
                           <TableCell>
-                            <Chip label={`${item.available_capacity.toFixed(1)}%`} color="warning" size="small" />
+                            <Chip label={`${item.free_hours.toFixed(1)} h`} color="warning" size="small" />
                           </TableCell>
                         </TableRow>
                       ))}
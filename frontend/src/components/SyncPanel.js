@@ -4,6 +4,7 @@ import { Sync as SyncIcon } from '@mui/icons-material';
 import axios from 'axios';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || '/api';
+const SYNC_POLL_INTERVAL_MS = 2000;
 
 const SyncPanel = () => {
   const [syncing, setSyncing] = useState(false);
@@ -35,13 +36,35 @@ const SyncPanel = () => {
         endpoint = '/sync/projects';
       } else if (type === 'users') {
         endpoint = '/sync/users';
+      } else if (type === 'worklogs') {
+        endpoint = '/sync/worklogs';
       }
 
-      const response = await axios.post(`${API_BASE_URL}${endpoint}`);
-      setMessage({
-        type: 'success',
-        text: `Synchronizacja zakończona: ${JSON.stringify(response.data)}`
-      });
+      // Synchronizację wykonuje worker - śledzimy zadanie i logi do jego zakończenia
+      let { data: job } = await axios.post(`${API_BASE_URL}${endpoint}`);
+      setMessage({ type: 'info', text: `Synchronizacja zlecona (zadanie ${job.id})...` });
+      while (job.status === 'pending' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, SYNC_POLL_INTERVAL_MS));
+        ({ data: job } = await axios.get(`${API_BASE_URL}/sync/jobs/${job.id}`));
+        loadSyncLogs();
+      }
+      
+      if (job.status === 'done') {
+        setMessage({
+          type: 'success',
+          text: `Synchronizacja zakończona: ${JSON.stringify(job.result)}`
+        });
+      } else if (job.status === 'partial') {
+        setMessage({
+          type: 'warning',
+          text: `Synchronizacja zakończona z błędami części etapów: ${JSON.stringify(job.result)}`
+        });
+      } else {
+        setMessage({
+          type: 'error',
+          text: `Błąd synchronizacji: ${job.error_message || JSON.stringify(job.result)}`
+        });
+      }
       loadSyncLogs();
     } catch (error) {
       setMessage({
@@ -82,6 +105,13 @@ const SyncPanel = () => {
           >
             Synchronizuj użytkowników
           </Button>
+          <Button
+            variant="outlined"
+            onClick={() => handleSync('worklogs')}
+            disabled={syncing}
+          >
+            Synchronizuj worklogi
+          </Button>
         </Box>
 
         {message && (
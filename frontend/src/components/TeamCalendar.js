@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import moment from 'moment';
 import 'moment/locale/pl';
 import { Calendar, momentLocalizer } from 'react-big-calendar';
@@ -11,6 +11,9 @@ import axios from 'axios';
 moment.locale('pl');
 const localizer = momentLocalizer(moment);
 const API_BASE_URL = process.env.REACT_APP_API_URL || '/api';
+// Alokacje ładowane są stronami - kalendarz rysuje się po pierwszej z nich
+const ALLOCATIONS_PAGE_SIZE = 200;
+const ALLOCATION_FIELDS = 'user_id,project_id,role,start_date,end_date,allocation_percentage';
 
 const TeamCalendar = () => {
   const [events, setEvents] = useState([]);
@@ -20,6 +23,7 @@ const TeamCalendar = () => {
   const [selectedUser, setSelectedUser] = useState('');
   const [currentDate, setCurrentDate] = useState(new Date());
   const [view, setView] = useState('month');
+  const calendarRequest = useRef(0);
 
   useEffect(() => {
     loadData();
@@ -32,8 +36,8 @@ const TeamCalendar = () => {
   const loadData = async () => {
     try {
       const [projectsRes, usersRes] = await Promise.all([
-        axios.get(`${API_BASE_URL}/projects`),
-        axios.get(`${API_BASE_URL}/users`)
+        axios.get(`${API_BASE_URL}/projects`, { params: { fields: 'name' } }),
+        axios.get(`${API_BASE_URL}/users`, { params: { fields: 'display_name' } })
       ]);
       setProjects(projectsRes.data);
       setUsers(usersRes.data);
@@ -43,29 +47,44 @@ const TeamCalendar = () => {
   };
 
   const loadCalendar = async () => {
+    // Odpowiedzi wcześniejszych zapytań (np. po zmianie miesiąca) są ignorowane
+    const requestId = ++calendarRequest.current;
     try {
       const startDate = moment(currentDate).startOf(view).format('YYYY-MM-DD');
       const endDate = moment(currentDate).endOf(view).format('YYYY-MM-DD');
       
-      const params = new URLSearchParams({
-        start_date: startDate,
-        end_date: endDate,
-        ...(selectedProject && { project_id: selectedProject }),
-        ...(selectedUser && { user_id: selectedUser })
-      });
+      let calendarEvents = [];
+      let afterId = null;
+      do {
+        const params = new URLSearchParams({
+          start_date: startDate,
+          end_date: endDate,
+          compact: 'true',
+          fields: ALLOCATION_FIELDS,
+          limit: ALLOCATIONS_PAGE_SIZE,
+          ...(afterId && { after_id: afterId }),
+          ...(selectedProject && { project_id: selectedProject }),
+          ...(selectedUser && { user_id: selectedUser })
+        });
 
-      const response = await axios.get(`${API_BASE_URL}/allocations?${params}`);
-      
-      const calendarEvents = response.data.map(allocation => ({
-        id: allocation.id,
-        title: `${allocation.user?.display_name || ''} - ${allocation.project?.name || ''} (${allocation.allocation_percentage}%)`,
-        start: new Date(allocation.start_date),
-        end: allocation.end_date ? new Date(allocation.end_date) : new Date(moment().add(1, 'year')),
-        resource: allocation,
-        color: getColorForProject(allocation.project_id)
-      }));
+        const response = await axios.get(`${API_BASE_URL}/allocations?${params}`);
+        if (requestId !== calendarRequest.current) {
+          return;
+        }
+        const { allocations, users: usersById, projects: projectsById, next_after_id } = response.data;
+        
+        calendarEvents = calendarEvents.concat(allocations.map(allocation => ({
+          id: allocation.id,
+          title: `${usersById[allocation.user_id]?.display_name || ''} - ${projectsById[allocation.project_id]?.name || ''} (${allocation.allocation_percentage}%)`,
+          start: new Date(allocation.start_date),
+          end: allocation.end_date ? new Date(allocation.end_date) : new Date(moment().add(1, 'year')),
+          resource: allocation,
+          color: getColorForProject(allocation.project_id)
+        })));
 
-      setEvents(calendarEvents);
+        setEvents(calendarEvents);
+        afterId = next_after_id;
+      } while (afterId);
     } catch (error) {
       console.error('Błąd podczas ładowania kalendarza:', error);
     }